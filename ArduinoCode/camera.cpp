@@ -16,6 +16,7 @@ const int MAX_RETRIES = 3;
 const int UPLOAD_TIMEOUT = 30000; // 30 seconds timeout
 const int STATUS_TIMEOUT = 10000;  // 10 seconds timeout
 const int WIFI_RETRY_DELAY = 5000; // 5 seconds
+unsigned long retryAfterMs = 0;    // Set from the server's Retry-After header when it is overloaded
 
 // Camera and connection state
 bool cameraInitialized = false;
@@ -276,8 +277,11 @@ bool captureAndUploadImageWithRetry() {
     }
     
     if (attempt < MAX_RETRIES) {
-      Serial.printf("Upload failed, retrying in %d seconds...\n", attempt * 2);
-      delay(attempt * 2000); // Progressive delay
+      // Progressive delay, or the server's Retry-After if it asked for longer
+      unsigned long retryDelay = max((unsigned long)(attempt * 2000), retryAfterMs);
+      retryAfterMs = 0;
+      Serial.printf("Upload failed, retrying in %lu seconds...\n", retryDelay / 1000);
+      delay(retryDelay);
     }
   }
   
@@ -328,6 +332,8 @@ bool captureAndUploadImage() {
   http.addHeader("Content-Type", "image/jpeg");
   http.addHeader("Content-Length", String(fb->len));
   http.addHeader("Connection", "close"); // Ensure connection is closed after request
+  const char* responseHeaders[] = {"Retry-After"};
+  http.collectHeaders(responseHeaders, 1);
   
   Serial.println("Starting image upload...");
   unsigned long uploadStart = millis();
@@ -337,6 +343,15 @@ bool captureAndUploadImage() {
   unsigned long uploadTime = millis() - uploadStart;
   Serial.printf("Upload completed in %lu ms\n", uploadTime);
   
+  // Server is overloaded: back off for as long as it asks instead of retrying immediately
+  if (httpCode == 429 || httpCode == 503) {
+    retryAfterMs = http.header("Retry-After").toInt() * 1000UL;
+    Serial.printf("Server busy (HTTP %d), retry after %lu ms\n", httpCode, retryAfterMs);
+    http.end();
+    esp_camera_fb_return(fb);
+    return false;
+  }
+  
   if (httpCode > 0) {
     Serial.printf("Upload successful! Response code: %d\n", httpCode);
     
@@ -1,11 +1,30 @@
-from flask import Flask, request, jsonify, send_from_directory, render_template
+from flask import Flask, request, jsonify, send_from_directory, render_template, g
 import os, uuid, json, time, traceback
-from detector.model import detect_human_simple
+import config
+from detector.model import detect_human, HumanDetector, DETECTION_TIERS
+from detector.gating import InferenceGate, GATE_CALIBRATE, GATE_ON
+from inference import InferenceQueue, QueueFull
+from concurrent.futures import TimeoutError as InferenceTimeout
+from occupancy_grid import OccupancyGrid
+from event_log import EventLog, make_snapshot
+import metrics
+from metrics import stage
+from profiling import Profiler
 import logging
+from logging_setup import setup_logging
 from werkzeug.serving import WSGIRequestHandler
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Set up logging (queued, formatted and written by a background listener thread)
+log_handler = setup_logging(
+    level=config.LOG_LEVEL,
+    json_format=config.LOG_JSON,
+    queue_size=config.LOG_QUEUE_SIZE,
+    rate_limits=config.LOG_RATE_LIMITS,
+    sample_rates=config.LOG_SAMPLE_RATES,
+    aggregate_types=config.LOG_AGGREGATE_TYPES if config.LOG_AGGREGATE_POLLS else (),
+    summary_interval=config.LOG_SUMMARY_INTERVAL,
+    access_log_types=config.LOG_ACCESS_TYPES
+)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
@@ -21,6 +40,14 @@ os.makedirs('data', exist_ok=True)
 ROBOT_STATE_FILE = 'data/robot_state.json'
 MAP_DATA_FILE = 'data/map_data.json'
 
+# Occupancy grid files (cell states live here, not in map_data.json)
+GRID_FILE = 'data/occupancy_grid.npy'
+GRID_META_FILE = 'data/occupancy_grid.json'
+GRID_IMAGES_FILE = 'data/occupancy_grid_images.txt'
+
+# Append-only transition log (replay with: python event_log.py --at <time>)
+EVENT_LOG_DIR = 'data/events'
+
 def load_json(path, default=None):
     try:
         if os.path.exists(path):
@@ -31,11 +58,19 @@ def load_json(path, default=None):
     return default if default is not None else {}
 
 def save_json(path, data):
+    # Write to a temp file and rename so concurrent readers never see a truncated file
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
     try:
-        with open(path, 'w') as f:
-            json.dump(data, f, indent=2)
+        with stage('json_persist'):
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, path)
     except IOError as e:
         logger.error(f"Error saving {path}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
 
 def get_robot_state():
     """Get current robot state with defaults"""
@@ -55,35 +90,128 @@ def save_robot_state(state):
 def get_map_data():
     """Get map data with defaults"""
     return load_json(MAP_DATA_FILE, {
-        'visited_positions': [],  # [{'x': 0, 'y': 0, 'human_detected': False, 'blocked': False, 'image_path': '...', 'timestamp': ...}]
-        'exploration_stack': [],  # DFS stack for positions to explore
-        'blocked_positions': []   # List of permanently blocked positions [{'x': 0, 'y': 0, 'timestamp': ...}]
+        'exploration_stack': []  # DFS stack for positions to explore
     })
 
 def save_map_data(data):
     """Save map data"""
     save_json(MAP_DATA_FILE, data)
-
-def is_position_blocked(x, y, map_data):
+    grid.flush()
+
+def load_grid():
+    """Open the occupancy grid, migrating positions from a legacy map_data.json"""
+    occupancy_grid = OccupancyGrid(GRID_FILE, GRID_META_FILE, GRID_IMAGES_FILE,
+                                   max_coordinate=config.MAP_MAX_COORDINATE)
+    map_data = get_map_data()
+    if 'visited_positions' in map_data or 'blocked_positions' in map_data:
+        occupancy_grid.import_positions(map_data.pop('visited_positions', []),
+                                        map_data.pop('blocked_positions', []))
+        save_json(MAP_DATA_FILE, map_data)
+        logger.info("Migrated visited/blocked positions from map_data.json to occupancy grid")
+    return occupancy_grid
+
+def event_log_snapshot():
+    """Current grid, robot state and exploration stack for an event-log checkpoint"""
+    robot_state = get_robot_state()
+    robot = {key: robot_state.get(key) for key in ('current_x', 'current_y', 'is_running', 'waiting_for_image')}
+    return make_snapshot(grid.snapshot(), robot, get_map_data()['exploration_stack'])
+
+grid = load_grid()
+event_log = EventLog(EVENT_LOG_DIR, checkpoint_interval=config.EVENT_CHECKPOINT_INTERVAL,
+                     snapshot=event_log_snapshot, keep_checkpoints=config.EVENT_CHECKPOINT_KEEP)
+
+profiler = Profiler(
+    enabled=config.PROFILING_ENABLED,
+    sample_rate=config.PROFILE_SAMPLE_RATE,
+    interval=config.PROFILE_INTERVAL,
+    slow_threshold=config.SLOW_REQUEST_THRESHOLD,
+    buffer_size=config.SLOW_REQUEST_BUFFER_SIZE
+)
+metrics.STAGE_HOOKS.append(profiler.record_span)
+
+# Bounded detector queue: rejects uploads with 429 when full and degrades tiers as it fills
+inference_queue = InferenceQueue(
+    detect_human, HumanDetector, DETECTION_TIERS, config.INFERENCE_DEGRADE_AT,
+    workers=config.INFERENCE_WORKERS,
+    max_pending=config.INFERENCE_MAX_PENDING,
+    retry_after_max=config.INFERENCE_RETRY_AFTER_MAX,
+    profiler=profiler
+)
+
+# Cheap pre-detector check (frame differencing + HOG person proposals), see config.GATE_MODE
+gate = InferenceGate(
+    mode=config.GATE_MODE,
+    motion=config.GATE_MOTION,
+    proposals=config.GATE_PROPOSALS,
+    decode_scale=config.GATE_DECODE_SCALE,
+    pixel_threshold=config.GATE_PIXEL_THRESHOLD,
+    motion_threshold=config.GATE_MOTION_THRESHOLD,
+    hog_threshold=config.GATE_HOG_THRESHOLD
+)
+
+# Direction of a one-cell move; the gate compares frames taken facing the same way
+HEADINGS = {(1, 0): 'east', (-1, 0): 'west', (0, 1): 'north', (0, -1): 'south'}
+
+def inference_rejected(reason, retry_after, status=429):
+    """Backpressure response telling the camera when to retry"""
+    metrics.INFERENCE_REJECTED.inc(reason)
+    logger.warning(f"Image rejected ({reason}), retry after {retry_after}s")
+    return jsonify({'error': 'Detector overloaded', 'reason': reason, 'retry_after': retry_after}), \
+        status, {'Retry-After': str(retry_after)}
+
+def is_position_blocked(x, y):
     """Check if a position is blocked"""
-    # Check in visited positions for blocked flag
-    for pos in map_data['visited_positions']:
-        if pos['x'] == x and pos['y'] == y and pos.get('blocked', False):
-            return True
-    
-    # Check in dedicated blocked positions list
-    for pos in map_data.get('blocked_positions', []):
-        if pos['x'] == x and pos['y'] == y:
-            return True
-    
-    return False
+    return grid.is_blocked(x, y)
 
-def is_position_visited(x, y, map_data):
+def is_position_visited(x, y):
     """Check if a position has been visited (explored or blocked)"""
-    for pos in map_data['visited_positions']:
-        if pos['x'] == x and pos['y'] == y:
-            return True
-    return False
+    return grid.is_visited(x, y)
+
+# Map and event-log gauges are computed only when /metrics is scraped
+metrics.registry.gauge('macrobot_map_cells', 'Allocated occupancy grid cells',
+                       callback=lambda: grid.cells.size)
+metrics.registry.gauge('macrobot_map_positions', 'Occupancy grid cells by state', ('state',),
+                       callback=lambda: {(name,): count for name, count in grid.statistics().items()})
+metrics.registry.gauge('macrobot_frontier_size', 'Unknown cells adjacent to explored cells',
+                       callback=lambda: len(grid.frontier()))
+metrics.registry.gauge('macrobot_exploration_stack_size', 'Positions waiting in the DFS stack',
+                       callback=lambda: len(get_map_data()['exploration_stack']))
+metrics.registry.gauge('macrobot_inference_pending', 'Images queued or being processed by the detector',
+                       callback=lambda: inference_queue.pending)
+metrics.registry.gauge('macrobot_inference_running', 'Images currently being processed by the detector',
+                       callback=lambda: inference_queue.running)
+metrics.registry.gauge('macrobot_inference_degradation_level', 'Detection tier index of the last job (0 = full)',
+                       callback=lambda: inference_queue.last_level)
+metrics.registry.gauge('macrobot_log_records_dropped', 'Log records dropped because the log queue was full',
+                       callback=lambda: log_handler.dropped)
+metrics.registry.gauge('macrobot_log_queue_depth', 'Log records waiting for the listener thread',
+                       callback=lambda: log_handler.queue.qsize())
+metrics.registry.gauge('macrobot_event_log_seq', 'Sequence number of the last logged event',
+                       callback=lambda: event_log.seq)
+
+def _route_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc(_route_label())
+    g.profile = profiler.begin(request.method, request.path)
+
+@app.after_request
+def record_request_metrics(response):
+    route = _route_label()
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, request.method, route)
+    metrics.REQUESTS_TOTAL.inc(request.method, route, str(response.status_code))
+    g.status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request(error=None):
+    if 'request_start' in g:
+        metrics.REQUESTS_IN_FLIGHT.dec(_route_label())
+    if g.get('profile') is not None:
+        profiler.end(g.profile, g.get('status', 500))
 
 # Error handler for all exceptions
 @app.errorhandler(Exception)
@@ -112,8 +240,8 @@ def get_robot_status():
         
         # Check if robot has been at current position and needs image
         current_pos = (state['current_x'], state['current_y'])
-        position_explored = is_position_visited(current_pos[0], current_pos[1], map_data)
-        position_blocked = is_position_blocked(current_pos[0], current_pos[1], map_data)
+        position_explored = is_position_visited(current_pos[0], current_pos[1])
+        position_blocked = is_position_blocked(current_pos[0], current_pos[1])
         
         response = {
             'current_position': {'x': state['current_x'], 'y': state['current_y']},
@@ -129,7 +257,7 @@ def get_robot_status():
                 # Filter out blocked positions from exploration stack
                 available_positions = [
                     pos for pos in map_data['exploration_stack']
-                    if not is_position_blocked(pos['x'], pos['y'], map_data)
+                    if not is_position_blocked(pos['x'], pos['y'])
                 ]
                 
                 if available_positions:
@@ -150,7 +278,11 @@ def get_robot_status():
                 # No more positions to explore
                 response['exploration_complete'] = True
         
-        logger.info(f"Status check - Position: ({state['current_x']}, {state['current_y']}), Running: {state['is_running']}")
+        # High-frequency poll log: lazy formatting so rate-limited records cost almost nothing
+        logger.info("Status check - Position: (%s, %s), Running: %s",
+                    state['current_x'], state['current_y'], state['is_running'],
+                    extra={'msg_type': 'status_poll',
+                           'fields': {'x': state['current_x'], 'y': state['current_y'], 'is_running': state['is_running']}})
         return jsonify(response)
         
     except Exception as e:
@@ -180,11 +312,12 @@ def start_exploration():
             # Filter out any blocked positions
             initial_positions = [
                 pos for pos in initial_positions
-                if not is_position_blocked(pos['x'], pos['y'], map_data)
+                if not is_position_blocked(pos['x'], pos['y'])
             ]
             map_data['exploration_stack'] = initial_positions
             save_map_data(map_data)
         
+        event_log.record('start', exploration_stack=map_data['exploration_stack'])
         logger.info("Exploration started")
         return jsonify({'status': 'exploration_started'})
         
@@ -200,6 +333,7 @@ def stop_exploration():
         state['is_running'] = False
         state['waiting_for_image'] = False
         save_robot_state(state)
+        event_log.record('stop')
         logger.info("Exploration stopped")
         return jsonify({'status': 'exploration_stopped'})
         
@@ -233,23 +367,33 @@ def update_position():
         if x is None or y is None:
             return jsonify({'error': 'Missing x or y coordinates'}), 400
         
+        if not grid.in_bounds(x, y):
+            return jsonify({'error': 'Coordinates outside the map extent',
+                            'max_coordinate': config.MAP_MAX_COORDINATE}), 400
+        
         state = get_robot_state()
+        heading = HEADINGS.get((x - state['current_x'], y - state['current_y']))
+        if heading is not None:
+            state['heading'] = heading
         state['current_x'] = x
         state['current_y'] = y
         
         # Check if this position is blocked
-        map_data = get_map_data()
-        if is_position_blocked(x, y, map_data):
+        if is_position_blocked(x, y):
             # Position is blocked, don't wait for image
             state['waiting_for_image'] = False
-            logger.info(f"Position updated to blocked position ({x}, {y})")
+            logger.info("Position updated to blocked position (%s, %s)", x, y,
+                        extra={'msg_type': 'position_update', 'fields': {'x': x, 'y': y, 'blocked': True}})
             save_robot_state(state)
+            event_log.record('position', x=x, y=y, waiting_for_image=False)
             return jsonify({'status': 'position_updated', 'action': 'position_blocked'})
         else:
             # Normal position, wait for image
             state['waiting_for_image'] = True
             save_robot_state(state)
-            logger.info(f"Position updated to ({x}, {y}) - waiting for image")
+            event_log.record('position', x=x, y=y, waiting_for_image=True)
+            logger.info("Position updated to (%s, %s) - waiting for image", x, y,
+                        extra={'msg_type': 'position_update', 'fields': {'x': x, 'y': y, 'blocked': False}})
             return jsonify({'status': 'position_updated', 'action': 'take_image'})
         
     except Exception as e:
@@ -284,6 +428,10 @@ def report_blocked_position():
         if x is None or y is None:
             return jsonify({'error': 'Missing x or y coordinates'}), 400
         
+        if not grid.in_bounds(x, y):
+            return jsonify({'error': 'Coordinates outside the map extent',
+                            'max_coordinate': config.MAP_MAX_COORDINATE}), 400
+        
         logger.info(f"Position ({x}, {y}) reported as blocked")
         
         # Get current map data
@@ -297,42 +445,12 @@ def report_blocked_position():
         ]
         removed_count = original_stack_length - len(map_data['exploration_stack'])
         
-        # Add to visited positions as blocked (no image, no human detection)
-        # Remove any existing entry for this position first
-        map_data['visited_positions'] = [
-            pos for pos in map_data['visited_positions'] 
-            if not (pos['x'] == x and pos['y'] == y)
-        ]
-        
-        # Add blocked position entry
-        map_data['visited_positions'].append({
-            'x': x,
-            'y': y,
-            'human_detected': False,
-            'blocked': True,
-            'image_path': None,
-            'timestamp': time.time()
-        })
-        
-        # Also add to dedicated blocked positions list for faster lookup
-        if 'blocked_positions' not in map_data:
-            map_data['blocked_positions'] = []
-        
-        # Remove existing entry if present
-        map_data['blocked_positions'] = [
-            pos for pos in map_data['blocked_positions']
-            if not (pos['x'] == x and pos['y'] == y)
-        ]
-        
-        # Add new blocked position entry
-        map_data['blocked_positions'].append({
-            'x': x,
-            'y': y,
-            'timestamp': time.time()
-        })
+        # Mark the cell as blocked (replaces any previous state for this position)
+        grid.mark_blocked(x, y, time.time())
         
         # Save updated map data
         save_map_data(map_data)
+        event_log.record('blocked', x=x, y=y)
         
         logger.info(f"Blocked position ({x}, {y}) processed. Removed {removed_count} entries from exploration stack")
         
@@ -358,31 +476,42 @@ def process_image():
         
         # Check if position is blocked - shouldn't receive images for blocked positions
         map_data = get_map_data()
-        if is_position_blocked(x, y, map_data):
+        if is_position_blocked(x, y):
             logger.warning(f"Received image for blocked position ({x}, {y})")
             return jsonify({'error': 'Position is blocked', 'human_detected': False}), 400
         
+        # Reject before receiving the upload if the detector backlog is already full
+        # (unless the gate may skip the detector for this frame, which needs the upload first)
+        gate_mode = gate.mode
+        if gate_mode != GATE_ON and inference_queue.is_full():
+            return inference_rejected('queue_full', inference_queue.retry_after())
+        
         # Handle different types of image uploads
         image_data = None
         filename = f"pos_{x}_{y}_{uuid.uuid4().hex[:8]}.jpg"
         filepath = os.path.join(UPLOAD_FOLDER, filename)
         
-        # Check if it's a file upload
-        if 'image' in request.files:
-            image = request.files['image']
-            if image.filename != '':
-                image.save(filepath)
+        # Receive the upload (multipart file or raw request body)
+        with stage('upload_receive'):
+            image = request.files.get('image')
+            body = request.get_data() if image is None else None
+        
+        with stage('disk_write'):
+            # Check if it's a file upload
+            if image is not None:
+                if image.filename != '':
+                    image.save(filepath)
+                    image_data = True
+            # Check if it's raw image data in request body
+            elif request.content_type and 'image' in request.content_type.lower():
+                with open(filepath, 'wb') as f:
+                    f.write(body)
+                image_data = True
+            # Check if data is in request body
+            elif body:
+                with open(filepath, 'wb') as f:
+                    f.write(body)
                 image_data = True
-        # Check if it's raw image data in request body
-        elif request.content_type and 'image' in request.content_type.lower():
-            with open(filepath, 'wb') as f:
-                f.write(request.data)
-            image_data = True
-        # Check if data is in request.data
-        elif request.data:
-            with open(filepath, 'wb') as f:
-                f.write(request.data)
-            image_data = True
         
         if not image_data:
             logger.error("No image data received")
@@ -393,65 +522,105 @@ def process_image():
             logger.error(f"Image file not created or empty: {filepath}")
             return jsonify({'error': 'Failed to save image'}), 500
         
-        logger.info(f"Image saved: {filepath} ({os.path.getsize(filepath)} bytes)")
-        
-        # Detect human with error handling
-        try:
-            human_detected = detect_human_simple(filepath)
-            logger.info(f"Human detection result: {human_detected}")
-        except Exception as e:
-            logger.error(f"Human detection failed: {str(e)}")
-            human_detected = False  # Default to False if detection fails
-        
-        # Update map data
-        # Remove current position from visited if exists and add updated entry
-        map_data['visited_positions'] = [
-            pos for pos in map_data['visited_positions'] 
-            if not (pos['x'] == x and pos['y'] == y)
-        ]
-        
-        map_data['visited_positions'].append({
-            'x': x,
-            'y': y,
-            'human_detected': human_detected,
-            'blocked': False,
-            'image_path': f'uploads/{filename}',
-            'timestamp': time.time()
-        })
-        
-        # Add new adjacent positions to exploration stack (DFS)
-        adjacent_positions = [
-            {'x': x + 1, 'y': y},
-            {'x': x - 1, 'y': y},
-            {'x': x, 'y': y + 1},
-            {'x': x, 'y': y - 1}
-        ]
-        
-        new_positions_count = 0
-        for pos in adjacent_positions:
-            # Check if position already visited, blocked, or in stack
-            already_visited = is_position_visited(pos['x'], pos['y'], map_data)
-            already_blocked = is_position_blocked(pos['x'], pos['y'], map_data)
-            already_in_stack = any(
-                s['x'] == pos['x'] and s['y'] == pos['y'] 
-                for s in map_data['exploration_stack']
-            )
+        image_size = os.path.getsize(filepath)
+        logger.info("Image saved: %s (%s bytes)", filepath, image_size,
+                    extra={'msg_type': 'image_saved', 'fields': {'path': filepath, 'bytes': image_size}})
+        
+        # Gate: skip the heavy detector for frames with no change at this heading and no person proposal
+        gate_passed = True
+        if gate_mode in (GATE_CALIBRATE, GATE_ON):
+            with stage('gate'):
+                gate_passed, gate_info = gate.check(filepath, state.get('heading', 'unknown'))
+            metrics.GATE_DECISIONS.inc(gate_mode, 'pass' if gate_passed else 'skip')
+        
+        timings = {}
+        tier, degradation_level = None, None
+        if not gate_passed and gate_mode == GATE_ON:
+            human_detected, tier = False, 'gated'
+            metrics.INFERENCE_RESULTS.inc(tier)
+            logger.info("Frame skipped by gate (motion: %s)", gate_info.get('motion'),
+                        extra={'msg_type': 'detection_result',
+                               'fields': {'x': x, 'y': y, 'human_detected': False, 'tier': tier}})
+        else:
+            # Detect human on the inference queue
+            try:
+                future = inference_queue.submit(filepath, profile=g.get('profile'))
+            except QueueFull as e:
+                os.remove(filepath)
+                gate.forget(state.get('heading', 'unknown'))  # Let the retried frame through the gate
+                return inference_rejected('queue_full', e.retry_after)
             
-            if not already_visited and not already_blocked and not already_in_stack:
-                map_data['exploration_stack'].append(pos)
-                new_positions_count += 1
+            try:
+                with stage('detect'):
+                    result, timings, degradation_level = future.result(timeout=config.INFERENCE_TIMEOUT)
+                human_detected = result.get('has_human', False)
+                tier = result.get('tier', DETECTION_TIERS[degradation_level])
+                metrics.INFERENCE_RESULTS.inc(tier)
+                logger.info("Human detection result: %s (tier: %s)", human_detected, tier,
+                            extra={'msg_type': 'detection_result',
+                                   'fields': {'x': x, 'y': y, 'human_detected': human_detected, 'tier': tier}})
+            except InferenceTimeout:
+                # Give up on this upload so the client is not held past its own timeout
+                if future.cancel():
+                    os.remove(filepath)
+                gate.forget(state.get('heading', 'unknown'))
+                return inference_rejected('timeout', inference_queue.retry_after(), status=503)
+            except Exception as e:
+                logger.error(f"Human detection failed: {str(e)}")
+                human_detected = False  # Default to False if detection fails
+            metrics.observe_stages(timings, prefix='detect_')
+        
+        if gate_mode == GATE_CALIBRATE and tier is not None:
+            if gate.record_calibration(gate_passed, human_detected):
+                logger.warning(f"Gate false negative at ({x}, {y}): {gate_info}")
+            metrics.GATE_CALIBRATION.inc('pass' if gate_passed else 'skip', str(human_detected).lower())
+            logger.info("Gate calibration: %s, detector: %s", 'pass' if gate_passed else 'skip', human_detected,
+                        extra={'msg_type': 'gate_calibration',
+                               'fields': dict(gate_info, x=x, y=y, passed=gate_passed, human_detected=human_detected)})
+        
+        with stage('map_update'):
+            # Update map data (replaces any previous state for this position)
+            grid.mark_explored(x, y, human_detected, f'uploads/{filename}', time.time())
+            
+            # Add new adjacent positions to exploration stack (DFS)
+            adjacent_positions = [
+                {'x': x + 1, 'y': y},
+                {'x': x - 1, 'y': y},
+                {'x': x, 'y': y + 1},
+                {'x': x, 'y': y - 1}
+            ]
+            
+            new_positions = []
+            for pos in adjacent_positions:
+                # Check if position already visited, blocked, or in stack
+                already_visited = is_position_visited(pos['x'], pos['y'])
+                already_blocked = is_position_blocked(pos['x'], pos['y'])
+                already_in_stack = any(
+                    s['x'] == pos['x'] and s['y'] == pos['y'] 
+                    for s in map_data['exploration_stack']
+                )
+                
+                if grid.in_bounds(pos['x'], pos['y']) and not already_visited and not already_blocked \
+                        and not already_in_stack:
+                    map_data['exploration_stack'].append(pos)
+                    new_positions.append(pos)
+            new_positions_count = len(new_positions)
         
         save_map_data(map_data)
         
         # Update robot state
         state['waiting_for_image'] = False
         save_robot_state(state)
+        event_log.record('image', x=x, y=y, human_detected=human_detected, tier=tier,
+                         image_path=f'uploads/{filename}', new_positions=new_positions)
         
         logger.info(f"Image processed successfully. Human detected: {human_detected}, New positions: {new_positions_count}")
         
         return jsonify({
             'status': 'image_processed',
             'human_detected': human_detected,
+            'detection_tier': tier,
+            'degradation_level': degradation_level,
             'new_positions_added': new_positions_count
         })
         
@@ -474,7 +643,7 @@ def get_next_move():
         # Filter out blocked positions from exploration stack
         available_positions = [
             pos for pos in map_data['exploration_stack']
-            if not is_position_blocked(pos['x'], pos['y'], map_data)
+            if not is_position_blocked(pos['x'], pos['y'])
         ]
         
         if not available_positions:
@@ -489,6 +658,7 @@ def get_next_move():
         # Get next position from stack (DFS - LIFO)
         next_position = map_data['exploration_stack'].pop()
         save_map_data(map_data)
+        event_log.record('move', x=next_position['x'], y=next_position['y'])
         
         logger.info(f"Next move: ({next_position['x']}, {next_position['y']})")
         
@@ -509,57 +679,21 @@ def get_map():
     try:
         map_data = get_map_data()
         
-        # Separate data by type for better visualization
-        explored_positions = []
-        blocked_positions = []
-        human_detected_positions = []
-        
-        for pos in map_data['visited_positions']:
-            if pos.get('blocked', False):
-                blocked_positions.append({
-                    'x': pos['x'],
-                    'y': pos['y'],
-                    'timestamp': pos['timestamp']
-                })
-            elif pos.get('human_detected', False):
-                human_detected_positions.append({
-                    'x': pos['x'],
-                    'y': pos['y'],
-                    'image_path': pos.get('image_path'),
-                    'timestamp': pos['timestamp']
-                })
-            else:
-                explored_positions.append({
-                    'x': pos['x'],
-                    'y': pos['y'],
-                    'image_path': pos.get('image_path'),
-                    'timestamp': pos['timestamp']
-                })
-        
-        # Add dedicated blocked positions if any
-        for pos in map_data.get('blocked_positions', []):
-            # Avoid duplicates
-            if not any(bp['x'] == pos['x'] and bp['y'] == pos['y'] for bp in blocked_positions):
-                blocked_positions.append({
-                    'x': pos['x'],
-                    'y': pos['y'],
-                    'timestamp': pos['timestamp']
-                })
+        # Separate data by type for better visualization (vectorized over the grid)
+        blocked_positions = grid.blocked_positions()
+        statistics = grid.statistics()
+        statistics['pending_exploration'] = len(map_data['exploration_stack'])
         
         response = {
-            'visited_positions': map_data['visited_positions'],  # Keep original for compatibility
+            'visited_positions': grid.visited_positions(),  # Keep original for compatibility
             'exploration_stack': map_data['exploration_stack'],
-            'blocked_positions': map_data.get('blocked_positions', []),
+            'blocked_positions': blocked_positions,
             # Enhanced data for visualization
-            'explored_positions': explored_positions,
+            'explored_positions': grid.explored_positions(),
             'blocked_positions_list': blocked_positions,
-            'human_detected_positions': human_detected_positions,
-            'statistics': {
-                'total_explored': len(explored_positions),
-                'total_blocked': len(blocked_positions),
-                'humans_found': len(human_detected_positions),
-                'pending_exploration': len(map_data['exploration_stack'])
-            }
+            'human_detected_positions': grid.human_positions(),
+            'frontier': grid.frontier(),
+            'statistics': statistics
         }
         
         return jsonify(response)
@@ -603,12 +737,14 @@ def reset_all():
         save_robot_state(initial_state)
         
         # Reset map data
+        grid.reset()
         initial_map = {
-            'visited_positions': [],
-            'exploration_stack': [],
-            'blocked_positions': []
+            'exploration_stack': []
         }
         save_map_data(initial_map)
+        # History stays in the event log; replay still reaches pre-reset states
+        event_log.record('reset')
+        gate.reset()
         
         logger.info("All data reset")
         return jsonify({'status': 'all_data_reset'})
@@ -617,6 +753,87 @@ def reset_all():
         logger.error(f"Error in reset_all: {str(e)}")
         return jsonify({'error': 'Failed to reset data', 'message': str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text-format metrics"""
+    return metrics.registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+# ===================== ADMIN ENDPOINTS =====================
+
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+def profiling_settings():
+    """Get or update profiling settings (enabled, sample_rate, slow_threshold)"""
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or request.form.to_dict()
+            profiler.configure(
+                enabled=data.get('enabled') in (True, 'true', '1', 1) if 'enabled' in data else None,
+                sample_rate=data.get('sample_rate'),
+                slow_threshold=data.get('slow_threshold')
+            )
+            logger.info(f"Profiling settings updated: {profiler.settings()}")
+        return jsonify(profiler.settings())
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': 'Invalid profiling settings', 'message': str(e)}), 400
+
+@app.route('/admin/gate', methods=['GET', 'POST'])
+def gate_settings():
+    """Get or update the inference gate (mode, motion_threshold, hog_threshold) and its calibration counts"""
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or request.form.to_dict()
+            gate.configure(
+                mode=data.get('mode'),
+                motion_threshold=data.get('motion_threshold'),
+                hog_threshold=data.get('hog_threshold')
+            )
+            logger.info(f"Gate settings updated: {gate.settings()}")
+        return jsonify({'settings': gate.settings(), 'statistics': gate.statistics()})
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': 'Invalid gate settings', 'message': str(e)}), 400
+
+@app.route('/admin/detections', methods=['POST'])
+def update_detections():
+    """Apply re-detection results {image_path: human_detected} (sent by redetect.py)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        detections = data.get('detections')
+        if not isinstance(detections, dict):
+            return jsonify({'error': 'Missing detections'}), 400
+        
+        changed = grid.update_detections({path: bool(value) for path, value in detections.items()})
+        if changed:
+            event_log.record('detections', detections=changed)
+        
+        logger.info(f"Re-detection results applied: {len(changed)} of {len(detections)} cells changed")
+        return jsonify({'status': 'detections_updated', 'updated': len(changed)})
+        
+    except Exception as e:
+        logger.error(f"Error in update_detections: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': 'Failed to update detections', 'message': str(e)}), 500
+
+@app.route('/admin/slow_requests', methods=['GET'])
+def list_slow_requests():
+    """List captured slow requests (newest first)"""
+    return jsonify({'slow_requests': profiler.list_slow_requests()})
+
+@app.route('/admin/slow_requests/<int:profile_id>', methods=['GET'])
+def get_slow_request(profile_id):
+    """Timing spans of a captured slow request"""
+    profile = profiler.get_slow_request(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Slow request not found'}), 404
+    return jsonify(profile.to_dict())
+
+@app.route('/admin/slow_requests/<int:profile_id>/flamegraph', methods=['GET'])
+def get_slow_request_flamegraph(profile_id):
+    """Collapsed stack samples of a captured slow request (flamegraph.pl / speedscope input)"""
+    profile = profiler.get_slow_request(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Slow request not found'}), 404
+    return profile.collapsed_stacks(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
 # Health check endpoint
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -0,0 +1,330 @@
+"""
+Load generator and benchmark for the exploration server
+
+Simulates N ESP8266 (controller) / ESP32-CAM (camera) pairs following the
+same protocol as the firmware:
+
+    controller: GET /robot/status -> GET /robot/next_move
+                -> POST /robot/position or POST /robot/blocked_position
+    camera:     GET /robot/status -> POST /robot/image when needs_image
+
+Each controller checks moves against its own synthetic obstacle map.
+Note that the server tracks a single robot, so concurrent pairs share (and
+race on) the same exploration state; this is intended to stress the server.
+
+Usage:
+    python benchmark.py --robots 8 --duration 60 --output results.json
+    python benchmark.py --serve --stub-detector --robots 16 --duration 30
+    python benchmark.py --serve --stub-detector --compare results.json
+"""
+import os, sys, json, time, random, argparse, tempfile, threading, subprocess, types
+import urllib.request, urllib.error
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ===================== HTTP CLIENT =====================
+
+class Recorder:
+    """Collects latencies and errors per endpoint"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def record(self, endpoint, seconds, status):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            self.statuses.setdefault(endpoint, {})
+            self.statuses[endpoint][status] = self.statuses[endpoint].get(status, 0) + 1
+            if status == 'error' or status >= 500:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+def request(recorder, server, method, path, body=None, content_type=None, timeout=60):
+    """Send one request, record its latency and return the decoded JSON body (or None)"""
+    headers = {'Connection': 'close'}
+    if content_type:
+        headers['Content-Type'] = content_type
+    req = urllib.request.Request(server + path, data=body, method=method, headers=headers)
+
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            payload = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        payload = e.read()
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        recorder.record(f'{method} {path}', time.perf_counter() - start, 'error')
+        return None
+    recorder.record(f'{method} {path}', time.perf_counter() - start, status)
+
+    try:
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+def post_json(recorder, server, path, data):
+    return request(recorder, server, 'POST', path, json.dumps(data).encode(), 'application/json')
+
+# ===================== SIMULATED DEVICES =====================
+
+def make_obstacle_map(seed, radius, density):
+    """Random set of blocked cells plus a wall at `radius` so exploration is finite"""
+    rng = random.Random(seed)
+    blocked = set()
+    for x in range(-radius, radius + 1):
+        for y in range(-radius, radius + 1):
+            if max(abs(x), abs(y)) == radius or ((x, y) != (0, 0) and rng.random() < density):
+                blocked.add((x, y))
+    return blocked
+
+def run_controller(recorder, server, obstacles, stop, poll_interval):
+    """ESP8266: poll status, fetch the next move and either move or report an obstacle"""
+    post_json(recorder, server, '/robot/position', {'x': 0, 'y': 0})
+    while not stop.is_set():
+        status = request(recorder, server, 'GET', '/robot/status')
+        if status and status.get('next_move') and not status.get('waiting_for_image'):
+            move = request(recorder, server, 'GET', '/robot/next_move')
+            target = move.get('next_move') if move else None
+            if target:
+                if (target['x'], target['y']) in obstacles:
+                    post_json(recorder, server, '/robot/blocked_position',
+                              {'x': target['x'], 'y': target['y'], 'blocked': True})
+                else:
+                    post_json(recorder, server, '/robot/position', {'x': target['x'], 'y': target['y']})
+        stop.wait(poll_interval)
+
+def run_camera(recorder, server, image, stop, poll_interval):
+    """ESP32-CAM: poll status and upload an image whenever one is needed, honouring Retry-After"""
+    while not stop.is_set():
+        status = request(recorder, server, 'GET', '/robot/status')
+        if status and status.get('needs_image'):
+            result = request(recorder, server, 'POST', '/robot/image', image, 'image/jpeg')
+            if result and result.get('retry_after'):
+                stop.wait(result['retry_after'])  # Backpressure (429/503), like the firmware
+                continue
+        stop.wait(poll_interval)
+
+def run_map_viewer(recorder, server, stop, interval):
+    """Dashboard: periodically fetch the map"""
+    while not stop.is_set():
+        request(recorder, server, 'GET', '/data/map')
+        stop.wait(interval)
+
+# ===================== REPORTING =====================
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    total = 0
+    for endpoint, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        total += len(values)
+        endpoints[endpoint] = {
+            'count': len(values),
+            'errors': recorder.errors.get(endpoint, 0),
+            'statuses': {str(status): count for status, count in recorder.statuses[endpoint].items()},
+            'throughput': len(values) / elapsed,
+            'mean': sum(values) / len(values),
+            'p50': percentile(values, 0.50),
+            'p95': percentile(values, 0.95),
+            'p99': percentile(values, 0.99),
+            'max': values[-1]
+        }
+    return {'total_requests': total, 'throughput': total / elapsed, 'endpoints': endpoints}
+
+def print_report(results):
+    print(f"\n{results['total_requests']} requests in {results['elapsed']:.1f}s "
+          f"({results['throughput']:.1f} req/s) with {results['config']['robots']} robot(s)\n")
+    print(f"{'endpoint':32} {'count':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, stats in results['endpoints'].items():
+        print(f"{endpoint:32} {stats['count']:7d} {stats['errors']:5d} {stats['throughput']:8.1f} "
+              f"{stats['p50'] * 1000:8.1f} {stats['p95'] * 1000:8.1f} {stats['p99'] * 1000:8.1f}")
+
+def compare(results, baseline, tolerance):
+    """Print p95/throughput changes against a previous run; returns True if anything regressed"""
+    regressed = False
+    print(f"\nComparison with baseline (tolerance {tolerance:.0%}):")
+    for endpoint, stats in results['endpoints'].items():
+        base = baseline['endpoints'].get(endpoint)
+        if base is None:
+            print(f"  {endpoint:32} new endpoint")
+            continue
+        p95_change = (stats['p95'] - base['p95']) / base['p95'] if base['p95'] else 0.0
+        throughput_change = ((stats['throughput'] - base['throughput']) / base['throughput']
+                             if base['throughput'] else 0.0)
+        flag = ''
+        if p95_change > tolerance or throughput_change < -tolerance:
+            flag = '  REGRESSION'
+            regressed = True
+        print(f"  {endpoint:32} p95 {p95_change:+7.1%}  throughput {throughput_change:+7.1%}{flag}")
+    return regressed
+
+# ===================== LOCAL SERVER =====================
+
+def install_stub_detector(delay, human_rate):
+    """Replace detector.model with a stub so the server runs without the model stack
+
+    Cheaper tiers take a fraction of `delay`, like the real stack.
+    """
+    tiers = ('full', 'reduced', 'minimal')
+    tier_cost = {'full': 1.0, 'reduced': 0.3, 'minimal': 0.1}
+
+    def detect_human(image_path, timings=None, detector=None, tier='full'):
+        time.sleep(delay * tier_cost[tier])
+        if timings is not None:
+            timings['stub'] = delay * tier_cost[tier]
+        return {'has_human': random.random() < human_rate, 'detection_methods': ['stub'], 'tier': tier}
+
+    def detect_human_simple(image_path, timings=None):
+        return detect_human(image_path, timings)['has_human']
+
+    package = types.ModuleType('detector')
+    package.__path__ = [os.path.join(REPO_DIR, 'detector')]
+    module = types.ModuleType('detector.model')
+    module.detect_human = detect_human
+    module.detect_human_simple = detect_human_simple
+    module.HumanDetector = lambda: None
+    module.DETECTION_TIERS = tiers
+    package.model = module
+    sys.modules['detector'] = package
+    sys.modules['detector.model'] = module
+
+def run_server(port, stub_detector, detector_delay, human_rate):
+    """Serve app2 from a scratch working directory (its data/ and uploads/ are relative)"""
+    from werkzeug.serving import make_server
+
+    os.chdir(tempfile.mkdtemp(prefix='macrobot-bench-'))
+    sys.path.insert(0, REPO_DIR)
+    if stub_detector:
+        install_stub_detector(detector_delay, human_rate)
+    import app2
+
+    server = make_server('127.0.0.1', port, app2.app, threaded=True, request_handler=app2.CustomRequestHandler)
+    server.serve_forever()
+
+def start_server_process(args):
+    command = [sys.executable, os.path.abspath(__file__), '--run-server', '--port', str(args.port),
+               '--detector-delay', str(args.detector_delay), '--human-rate', str(args.human_rate)]
+    if args.stub_detector:
+        command.append('--stub-detector')
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + 120  # The real detector stack can take a while to import
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{args.port}/health', timeout=1):
+                return process
+        except (urllib.error.URLError, OSError):
+            if process.poll() is not None:
+                raise RuntimeError('Local server exited during startup')
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('Local server did not become healthy')
+
+# ===================== MAIN =====================
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate N robots against the exploration server')
+    parser.add_argument('--server', default='http://localhost:8000', help='Server URL (ignored with --serve)')
+    parser.add_argument('--robots', type=int, default=4, help='Number of ESP8266/ESP32-CAM pairs')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+    parser.add_argument('--poll-interval', type=float, default=0.5, help='Controller/camera poll interval (s)')
+    parser.add_argument('--map-interval', type=float, default=2.0, help='Dashboard /data/map interval (s), 0 to disable')
+    parser.add_argument('--image', default=os.path.join(REPO_DIR, 'dummy.jpg'), help='JPEG uploaded by cameras')
+    parser.add_argument('--radius', type=int, default=30, help='Half-size of the synthetic obstacle map')
+    parser.add_argument('--density', type=float, default=0.15, help='Fraction of blocked cells')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the obstacle map shared by all pairs')
+    parser.add_argument('--no-reset', action='store_true', help='Do not POST /reset before starting')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Baseline results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed p95/throughput change before flagging')
+    parser.add_argument('--serve', action='store_true', help='Start a local server for the run')
+    parser.add_argument('--stub-detector', action='store_true', help='Use a stub detector in the local server')
+    parser.add_argument('--detector-delay', type=float, default=0.05, help='Stub detector latency (s)')
+    parser.add_argument('--human-rate', type=float, default=0.1, help='Stub detector positive rate')
+    parser.add_argument('--port', type=int, default=8765, help='Port for the local server')
+    parser.add_argument('--run-server', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_server:
+        run_server(args.port, args.stub_detector, args.detector_delay, args.human_rate)
+        return
+
+    server_process = None
+    if args.serve:
+        server_process = start_server_process(args)
+        args.server = f'http://127.0.0.1:{args.port}'
+
+    try:
+        with open(args.image, 'rb') as f:
+            image = f.read()
+
+        setup = Recorder()  # Setup requests are not part of the results
+        if not args.no_reset:
+            request(setup, args.server, 'POST', '/reset')
+        request(setup, args.server, 'POST', '/robot/start')
+
+        recorder = Recorder()
+        stop = threading.Event()
+        threads = []
+        # Every pair drives the same server-side robot, so they must all see the same world
+        obstacles = make_obstacle_map(args.seed, args.radius, args.density)
+        for robot in range(args.robots):
+            threads.append(threading.Thread(target=run_controller,
+                                            args=(recorder, args.server, obstacles, stop, args.poll_interval)))
+            threads.append(threading.Thread(target=run_camera,
+                                            args=(recorder, args.server, image, stop, args.poll_interval)))
+        if args.map_interval > 0:
+            threads.append(threading.Thread(target=run_map_viewer,
+                                            args=(recorder, args.server, stop, args.map_interval)))
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        stop.wait(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+
+    results = summarize(recorder, elapsed)
+    results['elapsed'] = elapsed
+    results['timestamp'] = time.time()
+    results['config'] = {
+        'robots': args.robots,
+        'duration': args.duration,
+        'poll_interval': args.poll_interval,
+        'map_interval': args.map_interval,
+        'server': 'local' if args.serve else args.server,
+        'stub_detector': args.stub_detector if args.serve else None,
+        'detector_delay': args.detector_delay if args.serve and args.stub_detector else None,
+        'image_bytes': len(image)
+    }
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+
+# ===================== PROFILING =====================
+
+# Opt-in request profiling (can also be toggled at runtime via POST /admin/profiling)
+PROFILING_ENABLED = os.environ.get('MACROBOT_PROFILING', '0') == '1'
+PROFILE_SAMPLE_RATE = float(os.environ.get('MACROBOT_PROFILE_SAMPLE_RATE', '0.1'))  # Fraction of requests stack-sampled
+PROFILE_INTERVAL = 0.005         # Seconds between stack samples
+SLOW_REQUEST_THRESHOLD = float(os.environ.get('MACROBOT_SLOW_REQUEST_THRESHOLD', '2.0'))  # Seconds
+SLOW_REQUEST_BUFFER_SIZE = 50    # Slow requests kept for /admin/slow_requests
+
+# ===================== LOGGING =====================
+
+LOG_LEVEL = os.environ.get('MACROBOT_LOG_LEVEL', 'INFO')
+LOG_JSON = os.environ.get('MACROBOT_LOG_JSON', '1') == '1'  # Structured (JSON) records
+LOG_QUEUE_SIZE = 10000           # Records are dropped (and counted) when the queue is full
+
+# Max INFO records per second for each high-frequency message type
+LOG_RATE_LIMITS = {
+    'status_poll': 1.0,
+    'position_update': 5.0,
+    'image_saved': 5.0,
+    'detection_result': 5.0
+}
+# Fraction of records kept per message type before rate limiting (1.0 = all)
+LOG_SAMPLE_RATES = {}
+
+# Replace individual poll messages with one summary per interval
+LOG_AGGREGATE_POLLS = os.environ.get('MACROBOT_LOG_AGGREGATE_POLLS', '0') == '1'
+LOG_AGGREGATE_TYPES = ('status_poll',)
+LOG_SUMMARY_INTERVAL = 30.0      # Seconds
+
+# werkzeug access-log lines for these paths get the msg_type, so they are rate limited/aggregated too
+LOG_ACCESS_TYPES = {
+    '/robot/status': 'status_poll'
+}
+
+# ===================== MAP =====================
+
+MAP_MAX_COORDINATE = 500         # Positions with |x| or |y| above this are rejected (bounds the grid file size)
+
+# ===================== EVENT LOG =====================
+
+EVENT_CHECKPOINT_INTERVAL = 500  # Events between replay checkpoints (copies of the grid, written in the background)
+EVENT_CHECKPOINT_KEEP = 20       # Newest checkpoints kept; older times replay from an earlier one or the log start
+
+# ===================== INFERENCE ADMISSION CONTROL =====================
+
+INFERENCE_WORKERS = 1            # Detector threads (each loads its own models once)
+INFERENCE_MAX_PENDING = 4        # Queued + running images before uploads get 429
+# Jobs waiting behind the current one at which the detector drops to a cheaper tier
+INFERENCE_DEGRADE_AT = {
+    'reduced': 1,                # YOLO only at reduced resolution
+    'minimal': 3                 # MediaPipe Face only
+}
+INFERENCE_TIMEOUT = 25.0         # Seconds; must stay below the ESP32-CAM UPLOAD_TIMEOUT (30 s)
+INFERENCE_RETRY_AFTER_MAX = 30   # Upper bound for the Retry-After header (seconds)
+
+# ===================== INFERENCE GATE =====================
+
+# 'off': every frame goes to the detector; 'calibrate': gate decisions are logged against full
+# inference (false-negative rate at GET /admin/gate); 'on': frames that fail the gate skip the detector
+GATE_MODE = os.environ.get('MACROBOT_GATE_MODE', 'off')  # Unknown modes fail at startup
+GATE_MOTION = True               # Frame differencing against the last frame at the same heading
+GATE_PROPOSALS = True            # HOG person proposals on a downscaled copy
+GATE_DECODE_SCALE = 2            # JPEG decoded at 1/2, 1/4 or 1/8 resolution for the gate
+GATE_PIXEL_THRESHOLD = 25        # Grayscale change (0-255) for a pixel to count as changed
+GATE_MOTION_THRESHOLD = 0.05     # Fraction of changed pixels that lets a frame through
+GATE_HOG_THRESHOLD = 0.0         # HOG SVM score for a person proposal (lower = more proposals)
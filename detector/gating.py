@@ -0,0 +1,170 @@
+import threading
+import logging
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Gate modes
+GATE_OFF = "off"              # Every frame goes to the detector
+GATE_CALIBRATE = "calibrate"  # Gate decides, but every frame still goes to the detector for comparison
+GATE_ON = "on"                # Frames that fail the gate skip the detector
+GATE_MODES = (GATE_OFF, GATE_CALIBRATE, GATE_ON)
+
+# JPEG decode flags that downscale during decoding (much cheaper than a full decode + resize)
+REDUCED_GRAYSCALE_FLAGS = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8
+}
+
+class InferenceGate:
+    """Cheap check that decides whether a frame is worth running the full detector on
+
+    A frame passes when it differs enough from the previous frame taken at the
+    same heading (frame differencing), or when OpenCV's HOG person detector,
+    run on a downscaled grayscale copy, proposes at least one person. The
+    first frame at each heading always passes. In calibration mode the caller
+    runs the detector anyway and reports the result with record_calibration(),
+    which tracks how many frames with people the gate would have skipped.
+    """
+
+    def __init__(self, mode=GATE_OFF, motion=True, proposals=True, decode_scale=2,
+                 motion_size=(80, 60), pixel_threshold=25, motion_threshold=0.05, hog_threshold=0.0):
+        if mode not in GATE_MODES:
+            raise ValueError(f"Unknown gate mode: {mode} (expected one of {', '.join(GATE_MODES)})")
+        if decode_scale not in REDUCED_GRAYSCALE_FLAGS:
+            raise ValueError(f"Unsupported gate decode scale: {decode_scale} (expected 1, 2, 4 or 8)")
+        if proposals and not hasattr(cv2, 'HOGDescriptor'):
+            logger.warning("HOG person detector not available in this OpenCV build, will skip person proposals")
+            proposals = False
+        self.mode = mode
+        self.motion = motion
+        self.proposals = proposals
+        self.decode_scale = decode_scale
+        self.motion_size = motion_size
+        self.pixel_threshold = pixel_threshold
+        self.motion_threshold = motion_threshold
+        self.hog_threshold = hog_threshold
+        self.lock = threading.Lock()
+        self.references = {}  # heading -> blurred low-resolution frame
+        self.local = threading.local()  # HOGDescriptor per thread
+        self.counts = {}
+
+        self.reset()
+
+    def configure(self, mode=None, motion_threshold=None, hog_threshold=None):
+        if mode is not None:
+            if mode not in GATE_MODES:
+                raise ValueError(f"Unknown gate mode: {mode}")
+            self.mode = mode
+        if motion_threshold is not None:
+            self.motion_threshold = float(motion_threshold)
+        if hog_threshold is not None:
+            self.hog_threshold = float(hog_threshold)
+
+    def settings(self):
+        return {
+            'mode': self.mode,
+            'motion': self.motion,
+            'proposals': self.proposals,
+            'decode_scale': self.decode_scale,
+            'pixel_threshold': self.pixel_threshold,
+            'motion_threshold': self.motion_threshold,
+            'hog_threshold': self.hog_threshold
+        }
+
+    def reset(self):
+        """Forget reference frames and counts (e.g. after the map is reset)"""
+        with self.lock:
+            self.references.clear()
+            self.counts = {
+                'frames': 0,
+                'passed': 0,
+                'skipped': 0,
+                'calibrated': 0,
+                'human_frames': 0,
+                'false_negatives': 0
+            }
+
+    def forget(self, heading):
+        """Drop the reference frame at a heading so the next frame there passes
+
+        Used when a frame that passed is not processed (e.g. rejected with
+        429), so its retry is not skipped as unchanged.
+        """
+        with self.lock:
+            self.references.pop(heading, None)
+
+    def _hog(self):
+        hog = getattr(self.local, 'hog', None)
+        if hog is None:
+            hog = self.local.hog = cv2.HOGDescriptor()
+            hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        return hog
+
+    def check(self, image_path, heading):
+        """
+        Returns (passed, info) where info holds the measurements behind the decision:
+        - reasons: why the frame passed ('no_reference', 'motion', 'proposal', 'unreadable', 'no_checks')
+        - motion: fraction of low-resolution pixels that changed since the last frame at this heading
+        - proposals: person boxes [x, y, w, h] in full-resolution pixels
+        """
+        info = {'heading': heading, 'reasons': []}
+        gray = cv2.imread(image_path, REDUCED_GRAYSCALE_FLAGS[self.decode_scale])
+        if gray is None:
+            info['reasons'].append('unreadable')  # Let the detector report the error
+            return self._decide(info)
+
+        if self.motion:
+            small = cv2.resize(gray, self.motion_size, interpolation=cv2.INTER_AREA)
+            small = cv2.GaussianBlur(small, (5, 5), 0)
+            with self.lock:
+                reference = self.references.get(heading)
+                self.references[heading] = small
+            if reference is None:
+                info['reasons'].append('no_reference')
+            else:
+                changed = np.count_nonzero(cv2.absdiff(small, reference) > self.pixel_threshold) / small.size
+                info['motion'] = round(float(changed), 4)
+                if changed >= self.motion_threshold:
+                    info['reasons'].append('motion')
+
+        if self.proposals:
+            boxes, _ = self._hog().detectMultiScale(gray, hitThreshold=self.hog_threshold,
+                                                    winStride=(8, 8), padding=(8, 8), scale=1.1)
+            info['proposals'] = [[int(value) * self.decode_scale for value in box] for box in boxes]
+            if len(boxes):
+                info['reasons'].append('proposal')
+
+        if not self.motion and not self.proposals:
+            info['reasons'].append('no_checks')
+        return self._decide(info)
+
+    def _decide(self, info):
+        passed = bool(info['reasons'])
+        with self.lock:
+            self.counts['frames'] += 1
+            self.counts['passed' if passed else 'skipped'] += 1
+        return passed, info
+
+    def record_calibration(self, passed, human_detected):
+        """Compare a gate decision with the full detector result; returns True for a false negative"""
+        false_negative = bool(human_detected) and not passed
+        with self.lock:
+            self.counts['calibrated'] += 1
+            if human_detected:
+                self.counts['human_frames'] += 1
+            if false_negative:
+                self.counts['false_negatives'] += 1
+        return false_negative
+
+    def statistics(self):
+        with self.lock:
+            stats = dict(self.counts)
+        stats['skip_rate'] = stats['skipped'] / stats['frames'] if stats['frames'] else None
+        # Share of frames with people (according to the detector) that the gate would have skipped
+        stats['false_negative_rate'] = (stats['false_negatives'] / stats['human_frames']
+                                        if stats['human_frames'] else None)
+        return stats
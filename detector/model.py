@@ -1,4 +1,6 @@
 import cv2
+import time
+import logging
 import mediapipe as mp
 import numpy as np
 from ultralytics import YOLO
@@ -6,6 +8,15 @@ import tensorflow as tf
 from PIL import Image
 import torch
 
+logger = logging.getLogger(__name__)
+
+# Detection tiers, from most accurate to cheapest (used to degrade under load)
+TIER_FULL = "full"        # Pose, Hands, Face, YOLO and OpenCV DNN
+TIER_REDUCED = "reduced"  # YOLO only, at reduced input resolution
+TIER_MINIMAL = "minimal"  # MediaPipe Face only
+DETECTION_TIERS = (TIER_FULL, TIER_REDUCED, TIER_MINIMAL)
+REDUCED_YOLO_IMGSZ = 320
+
 class HumanDetector:
     def __init__(self):
         """Initialize all the pre-built models for human detection"""
@@ -41,7 +52,7 @@ class HumanDetector:
         try:
             self.yolo_model = YOLO('yolov8n.pt')  # Will auto-download if not present
         except:
-            print("YOLO model not available, will skip YOLO detection")
+            logger.warning("YOLO model not available, will skip YOLO detection")
             self.yolo_model = None
         
         # OpenCV's DNN for person detection (alternative to YOLO)
@@ -57,13 +68,18 @@ class HumanDetector:
             )
             self.output_layers = self.net.getUnconnectedOutLayersNames()
         except:
-            print("OpenCV DNN model files not found, will skip DNN detection")
+            logger.warning("OpenCV DNN model files not found, will skip DNN detection")
             self.net = None
 
-def detect_human(image_path):
+def detect_human(image_path, timings=None, detector=None, tier=TIER_FULL):
     """
     Enhanced human detection using multiple pre-built ML models
     
+    If a `timings` dict is given, the duration in seconds of each stage
+    (model_load, decode, pose, hands, face, yolo, opencv_dnn) is stored in it.
+    Pass an existing `detector` to avoid reloading the models, and a cheaper
+    `tier` (see DETECTION_TIERS) to run only part of the stack.
+    
     Returns:
     dict: Comprehensive detection results including:
         - has_human: Boolean indicating if any human is detected
@@ -71,9 +87,26 @@ def detect_human(image_path):
         - body_parts: Dict of detected body parts
         - pose_info: Information about pose/orientation
         - confidence_scores: Confidence scores from different models
+        - tier: Detection tier that produced the result
     """
     
-    detector = HumanDetector()
+    if timings is None:
+        timings = {}
+    stage_start = time.perf_counter()
+    
+    def end_stage(name):
+        nonlocal stage_start
+        now = time.perf_counter()
+        timings[name] = now - stage_start
+        stage_start = now
+    
+    if detector is None:
+        detector = HumanDetector()
+        end_stage("model_load")
+    
+    # Without YOLO the reduced tier would run nothing; fall back to face only
+    if tier == TIER_REDUCED and detector.yolo_model is None:
+        tier = TIER_MINIMAL
     
     # Load image
     image = cv2.imread(image_path)
@@ -81,6 +114,7 @@ def detect_human(image_path):
         return {"error": "Could not load image", "has_human": False}
     
     rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    end_stage("decode")
     
     results = {
         "has_human": False,
@@ -98,12 +132,13 @@ def detect_human(image_path):
             "orientation": "unknown"
         },
         "confidence_scores": {},
-        "bounding_boxes": []
+        "bounding_boxes": [],
+        "tier": tier
     }
     
     # 1. MediaPipe Pose Detection
-    pose_results = detector.pose.process(rgb_image)
-    if pose_results.pose_landmarks:
+    pose_results = detector.pose.process(rgb_image) if tier == TIER_FULL else None
+    if pose_results is not None and pose_results.pose_landmarks:
         results["has_human"] = True
         results["detection_methods"].append("MediaPipe Pose")
         results["body_parts"]["full_body"] = True
@@ -130,27 +165,36 @@ def detect_human(image_path):
         else:
             results["pose_info"]["sitting"] = True
             results["pose_info"]["orientation"] = "sitting"
+    if pose_results is not None:
+        end_stage("pose")
     
     # 2. MediaPipe Hand Detection
-    hand_results = detector.hands.process(rgb_image)
-    if hand_results.multi_hand_landmarks:
+    hand_results = detector.hands.process(rgb_image) if tier == TIER_FULL else None
+    if hand_results is not None and hand_results.multi_hand_landmarks:
         results["has_human"] = True
         results["detection_methods"].append("MediaPipe Hands")
         results["body_parts"]["hands"] = True
         results["confidence_scores"]["hands"] = len(hand_results.multi_hand_landmarks)
+    if hand_results is not None:
+        end_stage("hands")
     
     # 3. MediaPipe Face Detection
-    face_results = detector.face_detection.process(rgb_image)
-    if face_results.detections:
+    face_results = detector.face_detection.process(rgb_image) if tier in (TIER_FULL, TIER_MINIMAL) else None
+    if face_results is not None and face_results.detections:
         results["has_human"] = True
         results["detection_methods"].append("MediaPipe Face")
         results["body_parts"]["face"] = True
         results["confidence_scores"]["face"] = face_results.detections[0].score[0]
+    if face_results is not None:
+        end_stage("face")
     
     # 4. YOLO Detection (if available)
-    if detector.yolo_model:
+    if detector.yolo_model and tier in (TIER_FULL, TIER_REDUCED):
         try:
-            yolo_results = detector.yolo_model(image_path)
+            if tier == TIER_REDUCED:
+                yolo_results = detector.yolo_model(image, imgsz=REDUCED_YOLO_IMGSZ)
+            else:
+                yolo_results = detector.yolo_model(image_path)
             for result in yolo_results:
                 boxes = result.boxes
                 if boxes is not None:
@@ -166,10 +210,11 @@ def detect_human(image_path):
                                 "confidence": float(box.conf)
                             })
         except Exception as e:
-            print(f"YOLO detection failed: {e}")
+            logger.error(f"YOLO detection failed: {e}")
+        end_stage("yolo")
     
     # 5. OpenCV DNN Detection (if available)
-    if detector.net:
+    if detector.net and tier == TIER_FULL:
         try:
             height, width = image.shape[:2]
             
@@ -205,7 +250,8 @@ def detect_human(image_path):
                             "confidence": float(confidence)
                         })
         except Exception as e:
-            print(f"OpenCV DNN detection failed: {e}")
+            logger.error(f"OpenCV DNN detection failed: {e}")
+        end_stage("opencv_dnn")
     
     # Remove duplicates from detection methods
     results["detection_methods"] = list(set(results["detection_methods"]))
@@ -225,7 +271,7 @@ if __name__ == "__main__":
     print(f"Confidence scores: {detection_result['confidence_scores']}")
 
 # Simple function that returns just True/False (backwards compatible)
-def detect_human_simple(image_path):
+def detect_human_simple(image_path, timings=None):
     """Simple version that just returns True/False"""
-    result = detect_human(image_path)
+    result = detect_human(image_path, timings)
     return result.get('has_human', False)
\ No newline at end of file
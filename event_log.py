@@ -0,0 +1,337 @@
+import os, json, time, queue, bisect, argparse, threading
+from datetime import datetime
+import numpy as np
+
+from occupancy_grid import CELL_UNKNOWN, CELL_EXPLORED, CELL_HUMAN, CELL_BLOCKED, NO_IMAGE
+
+SEGMENT_PREFIX = 'segment_'
+CHECKPOINT_PREFIX = 'checkpoint_'
+INDEX_FILE = 'index.jsonl'
+
+CELL_STATE_NAMES = {CELL_EXPLORED: 'explored', CELL_HUMAN: 'human', CELL_BLOCKED: 'blocked'}
+
+def empty_state():
+    """Replay state before any event has been applied"""
+    return {
+        'robot': {
+            'current_x': 0,
+            'current_y': 0,
+            'is_running': False,
+            'waiting_for_image': False
+        },
+        'cells': {},  # {"x,y": {'state': 'explored'|'human'|'blocked', 'image_path': ..., 'timestamp': ...}}
+        'exploration_stack': []
+    }
+
+def _remove_from_stack(stack, x, y):
+    return [pos for pos in stack if not (pos['x'] == x and pos['y'] == y)]
+
+def apply_event(state, event):
+    """Apply one logged transition to a replay state (in place)"""
+    kind = event['type']
+    robot = state['robot']
+
+    if kind == 'start':
+        robot['is_running'] = True
+        robot['waiting_for_image'] = False
+        state['exploration_stack'] = event['exploration_stack']
+    elif kind == 'stop':
+        robot['is_running'] = False
+        robot['waiting_for_image'] = False
+    elif kind == 'position':
+        robot['current_x'] = event['x']
+        robot['current_y'] = event['y']
+        robot['waiting_for_image'] = event['waiting_for_image']
+    elif kind == 'blocked':
+        state['cells'][f"{event['x']},{event['y']}"] = {
+            'state': 'blocked',
+            'image_path': None,
+            'timestamp': event['ts']
+        }
+        state['exploration_stack'] = _remove_from_stack(state['exploration_stack'], event['x'], event['y'])
+    elif kind == 'image':
+        state['cells'][f"{event['x']},{event['y']}"] = {
+            'state': 'human' if event['human_detected'] else 'explored',
+            'image_path': event['image_path'],
+            'timestamp': event['ts']
+        }
+        # Skip positions already queued: a checkpoint may be taken just after a concurrent request's change
+        stack = state['exploration_stack']
+        stack.extend(pos for pos in event['new_positions'] if pos not in stack)
+        robot['waiting_for_image'] = False
+    elif kind == 'detections':
+        # Offline re-detection results: {image_path: human_detected}
+        for cell in state['cells'].values():
+            if cell['state'] != 'blocked' and cell['image_path'] in event['detections']:
+                cell['state'] = 'human' if event['detections'][cell['image_path']] else 'explored'
+    elif kind == 'move':
+        state['exploration_stack'] = _remove_from_stack(state['exploration_stack'], event['x'], event['y'])
+    elif kind == 'reset':
+        state.clear()
+        state.update(empty_state())
+    return state
+
+class EventLog:
+    """Append-only, segment-rotated log of robot/map transitions
+
+    Events are written as compact JSON lines to segment_NNNNNNNN.log files.
+    The log keeps no replay state of its own: every `checkpoint_interval`
+    events it calls `snapshot()` (an in-memory copy of the live grid, robot
+    state and exploration stack), and a background thread writes that copy
+    as a compressed checkpoint and appends an entry (seq, timestamp, segment,
+    offset) to index.jsonl. A replay bisects the index and applies only the
+    events recorded after the nearest checkpoint. Only the newest
+    `keep_checkpoints` checkpoints are kept; older times replay from an
+    earlier checkpoint or from the start of the log.
+    """
+
+    def __init__(self, directory, segment_max_bytes=4 * 1024 * 1024, checkpoint_interval=500,
+                 snapshot=None, keep_checkpoints=20):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.checkpoint_interval = checkpoint_interval
+        self.snapshot = snapshot
+        self.keep_checkpoints = keep_checkpoints
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.index = load_index(directory)
+        if not self.index:
+            self.seq = 0
+            self.segment = 1
+            offset = 0
+            # Base entry: replay from the start of the log with an empty state (never pruned)
+            self._append_index({'seq': 0, 'timestamp': 0.0, 'segment': 1, 'offset': 0, 'checkpoint': None})
+        else:
+            # Find the end of the log from the last checkpoint onwards
+            last = self.index[-1]
+            self.seq, self.segment, offset = last['seq'], last['segment'], last['offset']
+            for segment, end_offset, event in read_events(directory, self.segment, offset):
+                self.seq, self.segment, offset = event['seq'], segment, end_offset
+            # Drop a torn record left by a crash so new events stay readable
+            path = self._segment_path(self.segment)
+            if os.path.exists(path) and os.path.getsize(path) > offset:
+                os.truncate(path, offset)
+
+        self.file = open(self._segment_path(self.segment), 'ab')
+        self.checkpoints = queue.Queue()
+        self.writer = threading.Thread(target=self._write_checkpoints, name='event-log-checkpoints', daemon=True)
+        self.writer.start()
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f'{SEGMENT_PREFIX}{segment:08d}.log')
+
+    def _append_index(self, entry):
+        with open(os.path.join(self.directory, INDEX_FILE), 'a') as f:
+            f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self.index.append(entry)
+
+    def _write_checkpoints(self):
+        """Background writer: save queued snapshots, index them and prune old ones"""
+        while True:
+            item = self.checkpoints.get()
+            if item is None:
+                return
+            entry, snapshot = item
+            path = os.path.join(self.directory, entry['checkpoint'])
+            try:
+                with open(path + '.tmp', 'wb') as f:
+                    np.savez_compressed(f, **snapshot)
+                os.replace(path + '.tmp', path)
+                self._append_index(entry)
+                self._prune()
+            except (IOError, OSError):
+                continue  # Replay falls back to the previous checkpoint
+
+    def _prune(self):
+        # The seq 0 entry is the replay base for times before every kept checkpoint
+        checkpoints = [entry for entry in self.index if entry['checkpoint'] is not None and entry['seq'] > 0]
+        expired = checkpoints[:-self.keep_checkpoints] if self.keep_checkpoints else []
+        if not expired:
+            return
+        names = {entry['checkpoint'] for entry in expired}
+        self.index = [entry for entry in self.index if entry['checkpoint'] not in names]
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + '.tmp', 'w') as f:
+            f.writelines(json.dumps(entry, separators=(',', ':')) + '\n' for entry in self.index)
+        os.replace(path + '.tmp', path)
+        for name in names:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def record(self, kind, **data):
+        """Append a transition to the log"""
+        with self.lock:
+            self.seq += 1
+            event = {'seq': self.seq, 'ts': time.time(), 'type': kind}
+            event.update(data)
+
+            self.file.write(json.dumps(event, separators=(',', ':')).encode() + b'\n')
+            self.file.flush()
+
+            offset = self.file.tell()
+            if offset >= self.segment_max_bytes:
+                self.file.close()
+                self.segment += 1
+                offset = 0
+                self.file = open(self._segment_path(self.segment), 'ab')
+
+            if self.snapshot is not None and self.seq % self.checkpoint_interval == 0:
+                # Only the in-memory copy happens here; compression and disk I/O run on the writer thread
+                entry = {
+                    'seq': self.seq,
+                    'timestamp': event['ts'],
+                    'segment': self.segment,
+                    'offset': offset,
+                    'checkpoint': f'{CHECKPOINT_PREFIX}{self.seq:08d}.npz'
+                }
+                self.checkpoints.put((entry, self.snapshot()))
+
+    def close(self):
+        self.checkpoints.put(None)
+        self.writer.join()
+        with self.lock:
+            self.file.close()
+
+def make_snapshot(grid_snapshot, robot, exploration_stack):
+    """Build the arrays of a checkpoint from OccupancyGrid.snapshot() and the JSON state"""
+    cells, origin_x, origin_y, images = grid_snapshot
+    return {
+        'cells': cells,
+        'origin': np.array([origin_x, origin_y]),
+        'images': np.array(images, dtype=str),
+        'state': np.array(json.dumps({'robot': robot, 'exploration_stack': exploration_stack}))
+    }
+
+def load_checkpoint(path):
+    """Turn a checkpoint file into a replay state"""
+    if path.endswith('.json'):  # Checkpoints written by earlier versions
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    with np.load(path) as data:
+        cells = data['cells']
+        origin_x, origin_y = data['origin'].tolist()
+        images = data['images'].tolist()
+        saved = json.loads(str(data['state']))
+
+    state = empty_state()
+    state['robot'].update(saved['robot'])
+    state['exploration_stack'] = saved['exploration_stack']
+    rows, cols = np.nonzero(cells['state'] != CELL_UNKNOWN)
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        cell = cells[row, col]
+        image_id = int(cell['image_id'])
+        state['cells'][f"{col + origin_x},{row + origin_y}"] = {
+            'state': CELL_STATE_NAMES[int(cell['state'])],
+            'image_path': images[image_id] if image_id != NO_IMAGE else None,
+            'timestamp': float(cell['timestamp'])
+        }
+    return state
+
+# ===================== REPLAY =====================
+
+def load_index(directory):
+    """Read checkpoint index entries (ordered by seq and timestamp)"""
+    path = os.path.join(directory, INDEX_FILE)
+    entries = []
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # Torn write at the end of the index
+    return entries
+
+def read_events(directory, segment, offset):
+    """Yield (segment, end offset, event) for every event from a segment/offset onwards"""
+    while True:
+        path = os.path.join(directory, f'{SEGMENT_PREFIX}{segment:08d}.log')
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    return  # Torn write at the end of the log
+                yield segment, offset, event
+        segment += 1
+        offset = 0
+
+def replay(directory, timestamp, index=None):
+    """Rebuild the state as of `timestamp`
+
+    Bisects the checkpoint index (O(log n)) and applies only the events
+    recorded after the chosen checkpoint.
+
+    Returns (state, seq of the last applied event, (segment, end offset) of the last applied event).
+    """
+    if index is None:
+        index = load_index(directory)
+    if not index:
+        return empty_state(), 0, None
+
+    position = bisect.bisect_right([entry['timestamp'] for entry in index], timestamp) - 1
+    entry = index[max(position, 0)]
+    if entry['checkpoint'] is None:
+        state = empty_state()
+    else:
+        state = load_checkpoint(os.path.join(directory, entry['checkpoint']))
+
+    seq = entry['seq']
+    last = (entry['segment'], entry['offset'])
+    for segment, offset, event in read_events(directory, entry['segment'], entry['offset']):
+        if event['ts'] > timestamp:
+            break
+        apply_event(state, event)
+        seq = event['seq']
+        last = (segment, offset)
+    return state, seq, last
+
+def events_between(directory, start, end):
+    """List events with start <= timestamp <= end"""
+    index = load_index(directory)
+    if not index:
+        return []
+    position = bisect.bisect_right([entry['timestamp'] for entry in index], start) - 1
+    entry = index[max(position, 0)]
+
+    events = []
+    for _, _, event in read_events(directory, entry['segment'], entry['offset']):
+        if event['ts'] > end:
+            break
+        if event['ts'] >= start:
+            events.append(event)
+    return events
+
+def parse_timestamp(value):
+    """Accept a Unix timestamp or an ISO-8601 date/time"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay the robot event log')
+    parser.add_argument('--dir', default='data/events', help='Event log directory')
+    parser.add_argument('--at', help='Rebuild the state at this time (Unix timestamp or ISO date); default: latest')
+    parser.add_argument('--events', nargs=2, metavar=('START', 'END'), help='List events between two times instead')
+    args = parser.parse_args()
+
+    if args.events:
+        for event in events_between(args.dir, parse_timestamp(args.events[0]), parse_timestamp(args.events[1])):
+            print(json.dumps(event))
+        return
+
+    timestamp = parse_timestamp(args.at) if args.at else float('inf')
+    state, seq, _ = replay(args.dir, timestamp)
+    print(json.dumps({'seq': seq, 'state': state}, indent=2))
+
+if __name__ == "__main__":
+    main()
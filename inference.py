@@ -0,0 +1,130 @@
+import math, time, queue, logging, threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    """Raised when the inference backlog is at capacity"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Inference queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class InferenceQueue:
+    """Bounded detector work queue with backpressure and load-based degradation
+
+    Each worker thread loads its own detector when it starts, before taking
+    jobs. At most `max_pending` jobs (queued + running) are admitted; beyond
+    that submit() raises QueueFull so the caller can answer 429. When a
+    worker picks up a job it chooses the detection tier from the number of jobs still waiting
+    behind it: the first tier (full) when nothing is waiting, and cheaper
+    tiers once the backlog reaches their threshold in `degrade_at`.
+
+    Jobs submitted with a request profile are stack-sampled by `profiler`
+    while they run, so the request's flame graph includes the detector.
+    """
+
+    def __init__(self, detect, detector_factory, tiers, degrade_at, workers=1, max_pending=4,
+                 retry_after_max=30, profiler=None):
+        self.detect = detect
+        self.detector_factory = detector_factory
+        self.tiers = tiers
+        self.degrade_at = degrade_at
+        self.max_pending = max_pending
+        self.retry_after_max = retry_after_max
+        self.profiler = profiler
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.last_level = 0
+        self.average_seconds = 1.0  # EWMA of job duration, seeds the Retry-After estimate
+
+        self.workers = []
+        for index in range(workers):
+            worker = threading.Thread(target=self._work, name=f'inference-{index}', daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def retry_after(self):
+        """Seconds a rejected client should wait for the current backlog to drain"""
+        with self.lock:
+            backlog = self.pending
+        seconds = math.ceil(self.average_seconds * backlog / len(self.workers))
+        return min(max(seconds, 1), self.retry_after_max)
+
+    def is_full(self):
+        with self.lock:
+            return self.pending >= self.max_pending
+
+    def submit(self, image_path, profile=None):
+        """Queue an image; returns a Future of (result, timings, tier level)"""
+        with self.lock:
+            if self.pending >= self.max_pending:
+                full = True
+            else:
+                full = False
+                self.pending += 1
+        if full:
+            raise QueueFull(self.retry_after())
+
+        future = Future()
+        self.jobs.put((image_path, future, time.perf_counter(), profile))
+        return future
+
+    def choose_level(self, waiting):
+        """Index into `tiers` for a job with `waiting` jobs queued behind it"""
+        level = 0
+        for index, tier in enumerate(self.tiers):
+            threshold = self.degrade_at.get(tier)
+            if threshold is not None and waiting >= threshold:
+                level = index
+        return level
+
+    def _load_detector(self):
+        try:
+            return self.detector_factory()
+        except Exception as e:
+            logger.error(f"Failed to load detector in {threading.current_thread().name}: {e}")
+            return None
+
+    def _work(self):
+        # Load the models before taking jobs so the first request does not pay for it within its timeout
+        start = time.perf_counter()
+        detector = self._load_detector()
+        if detector is not None:
+            logger.info(f"{threading.current_thread().name} loaded detector in {time.perf_counter() - start:.1f}s")
+        while True:
+            image_path, future, queued_at, profile = self.jobs.get()
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue  # The request gave up waiting
+                level = self.choose_level(self.jobs.qsize())
+                with self.lock:
+                    self.running += 1
+                    self.last_level = level
+
+                start = time.perf_counter()
+                timings = {'queue_wait': start - queued_at}
+                if self.profiler is not None:
+                    self.profiler.attach(profile)
+                try:
+                    if detector is None:
+                        # Loading failed at startup; retry on this job
+                        detector = self.detector_factory()
+                        timings['model_load'] = time.perf_counter() - start
+                    result = self.detect(image_path, timings=timings, detector=detector, tier=self.tiers[level])
+                    future.set_result((result, timings, level))
+                except Exception as e:
+                    logger.error(f"Inference failed for {image_path}: {e}")
+                    future.set_exception(e)
+                finally:
+                    if self.profiler is not None:
+                        self.profiler.detach(profile)
+                    elapsed = time.perf_counter() - start
+                    with self.lock:
+                        self.running -= 1
+                        self.average_seconds = 0.8 * self.average_seconds + 0.2 * elapsed
+            finally:
+                with self.lock:
+                    self.pending -= 1
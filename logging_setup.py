@@ -0,0 +1,236 @@
+import sys, json, time, queue, atexit, random, logging, threading
+from logging.handlers import QueueHandler, QueueListener
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, plus msg_type and extra fields"""
+
+    def format(self, record):
+        data = {
+            'ts': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage()
+        }
+        msg_type = getattr(record, 'msg_type', None)
+        if msg_type is not None:
+            data['msg_type'] = msg_type
+        fields = getattr(record, 'fields', None)
+        if fields:
+            data.update(fields)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, default=str)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only merge args and render the traceback here; full formatting runs on the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class RateLimitFilter(logging.Filter):
+    """Per-message-type sampling and rate limiting
+
+    Records tagged with extra={'msg_type': ...} are first sampled with
+    `sample_rates[msg_type]` and then limited to `rate_limits[msg_type]`
+    records per second (token bucket, burst of one second). The next record
+    that gets through reports how many were suppressed. Untagged records and
+    warnings/errors always pass.
+    """
+
+    def __init__(self, rate_limits=None, sample_rates=None):
+        super().__init__()
+        self.rate_limits = rate_limits or {}
+        self.sample_rates = sample_rates or {}
+        self.lock = threading.Lock()
+        self.buckets = {}  # msg_type -> [tokens, last refill time]
+        self.suppressed = {}
+
+    def filter(self, record):
+        msg_type = getattr(record, 'msg_type', None)
+        if msg_type is None or record.levelno >= logging.WARNING:
+            return True
+
+        sample_rate = self.sample_rates.get(msg_type)
+        if sample_rate is not None and random.random() >= sample_rate:
+            return self._suppress(msg_type)
+
+        rate = self.rate_limits.get(msg_type)
+        if rate is None:
+            return self._release(record, msg_type)
+
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(msg_type)
+            if bucket is None:
+                bucket = self.buckets[msg_type] = [rate, now]
+            bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                self.suppressed[msg_type] = self.suppressed.get(msg_type, 0) + 1
+                return False
+            bucket[0] -= 1
+        return self._release(record, msg_type)
+
+    def _suppress(self, msg_type):
+        with self.lock:
+            self.suppressed[msg_type] = self.suppressed.get(msg_type, 0) + 1
+        return False
+
+    def _release(self, record, msg_type):
+        with self.lock:
+            suppressed = self.suppressed.pop(msg_type, 0)
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+            record.args = None
+        return True
+
+class PollSummaryFilter(logging.Filter):
+    """Fold repeated messages of the given types into periodic summaries
+
+    Matching records are counted and dropped; once `interval` seconds have
+    passed, the window is reported as one summary (count and last message),
+    either by rewriting the next matching record or by flush(), which
+    setup_logging calls from a timer thread and at exit so the last window
+    is logged even when the messages stop.
+    """
+
+    def __init__(self, msg_types, interval=30.0):
+        super().__init__()
+        self.msg_types = set(msg_types)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.windows = {}  # msg_type -> [window start, count, last dropped record]
+
+    def filter(self, record):
+        msg_type = getattr(record, 'msg_type', None)
+        if msg_type not in self.msg_types or record.levelno >= logging.WARNING:
+            return True
+
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(msg_type)
+            if window is None:
+                window = self.windows[msg_type] = [now, 0, None]
+            window[1] += 1
+            elapsed = now - window[0]
+            if elapsed < self.interval:
+                window[2] = record
+                return False
+            count = window[1]
+            self.windows[msg_type] = [now, 0, None]
+
+        self._summarize(record, msg_type, count, elapsed)
+        return True
+
+    def _summarize(self, record, msg_type, count, elapsed):
+        record.msg = f"{count} {msg_type} messages in the last {elapsed:.0f}s (last: {record.getMessage()})"
+        record.args = None
+        record.fields = dict(getattr(record, 'fields', None) or {}, summary_count=count)
+        return record
+
+    def flush(self, emit, force=False):
+        """Pass a summary of every window that is due (or still open, with `force`) to emit(record)"""
+        now = time.monotonic()
+        due = []
+        with self.lock:
+            for msg_type, (start, count, last) in list(self.windows.items()):
+                if last is not None and (force or now - start >= self.interval):
+                    due.append((msg_type, count, now - start, last))
+                    self.windows[msg_type] = [now, 0, None]
+        for msg_type, count, elapsed, record in due:
+            emit(self._summarize(record, msg_type, count, elapsed))
+
+class AccessLogFilter(logging.Filter):
+    """Tag werkzeug access-log records with a msg_type by request path
+
+    Attached to the 'werkzeug' logger so that, for example, one access line
+    per status poll goes through the same rate limiting and aggregation as
+    the app's own 'status_poll' messages.
+    """
+
+    def __init__(self, path_types):
+        super().__init__()
+        self.path_types = dict(path_types)
+
+    def filter(self, record):
+        # werkzeug logs requests as '"%s" %s %s' % ('METHOD /path HTTP/1.1', status, size)
+        args = record.args
+        if isinstance(args, tuple) and len(args) == 3 and isinstance(args[0], str):
+            parts = args[0].split()
+            if len(parts) >= 2:
+                path = parts[1].split('?', 1)[0]
+                msg_type = self.path_types.get(path)
+                if msg_type is not None:
+                    record.msg_type = msg_type
+                    record.fields = {'path': path, 'status': args[1], 'access_log': True}
+        return True
+
+def setup_logging(level='INFO', json_format=True, queue_size=10000, rate_limits=None,
+                  sample_rates=None, aggregate_types=(), summary_interval=30.0, access_log_types=None):
+    """Route all logging through a bounded queue drained by a background listener
+
+    Request threads only run the filters and a non-blocking put; formatting
+    and stream I/O happen on the listener thread. `access_log_types` maps
+    request paths to the msg_type given to their werkzeug access-log lines.
+    """
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = NonBlockingQueueHandler(log_queue)
+    summary_filter = None
+    if aggregate_types:
+        summary_filter = PollSummaryFilter(aggregate_types, summary_interval)
+        handler.addFilter(summary_filter)
+    if rate_limits or sample_rates:
+        handler.addFilter(RateLimitFilter(rate_limits, sample_rates))
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if json_format:
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter('%(levelname)s:%(name)s:%(message)s'))
+
+    if access_log_types:
+        logging.getLogger('werkzeug').addFilter(AccessLogFilter(access_log_types))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    handler.listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    handler.listener.start()
+    atexit.register(handler.listener.stop)
+
+    if summary_filter is not None:
+        # Summaries bypass the handler's filters so they are never aggregated or rate limited themselves
+        emit = lambda record: handler.enqueue(handler.prepare(record))
+        stopped = threading.Event()
+
+        def flush_summaries():
+            while not stopped.wait(min(summary_interval, 1.0)):
+                summary_filter.flush(emit)
+
+        def final_flush():
+            stopped.set()
+            summary_filter.flush(emit, force=True)
+
+        threading.Thread(target=flush_summaries, name='log-summary', daemon=True).start()
+        atexit.register(final_flush)  # Runs before listener.stop (atexit is last-in, first-out)
+    return handler
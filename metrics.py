@@ -0,0 +1,190 @@
+import time, bisect, threading
+from contextlib import contextmanager
+
+# Latency buckets in seconds (detector stages can take several seconds)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus text format"""
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+        for label_values, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                labels = _format_labels(self.label_names + ('le',), label_values + (_format_value(bound),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {values[-2]}')
+            lines.append(f'{self.name}_count{labels} {values[-1]}')
+        return lines
+
+class Counter:
+    """Monotonic counter, optionally labelled"""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get(self, *label_values):
+        with self.lock:
+            return self.values.get(label_values, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self.lock:
+            values = dict(self.values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(self.label_names, label_values)} {value}')
+        return lines
+
+class Gauge:
+    """Gauge that is either set directly or computed by a callback at scrape time
+
+    Callbacks keep expensive values (map size, frontier size) off the request path.
+    """
+
+    def __init__(self, name, help_text, label_names=(), callback=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def set(self, value, *label_values):
+        with self.lock:
+            self.values[label_values] = value
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} gauge']
+        if self.callback is not None:
+            values = self.callback()
+            if not isinstance(values, dict):
+                values = {(): values}
+        else:
+            with self.lock:
+                values = dict(self.values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(self.label_names, label_values)} {value}')
+        return lines
+
+class Registry:
+    """Collection of metrics rendered together by the /metrics endpoint"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, label_names, buckets))
+
+    def counter(self, name, help_text, label_names=()):
+        return self.register(Counter(name, help_text, label_names))
+
+    def gauge(self, name, help_text, label_names=(), callback=None):
+        return self.register(Gauge(name, help_text, label_names, callback))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f'# {metric.name} unavailable: {e}')
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    'macrobot_request_duration_seconds', 'Request latency by route', ('method', 'route'))
+REQUESTS_TOTAL = registry.counter(
+    'macrobot_requests_total', 'Requests by route and status code', ('method', 'route', 'status'))
+REQUESTS_IN_FLIGHT = registry.gauge(
+    'macrobot_requests_in_flight', 'Requests currently being handled', ('route',))
+STAGE_SECONDS = registry.histogram(
+    'macrobot_stage_duration_seconds', 'Time spent in each processing stage', ('stage',))
+INFERENCE_REJECTED = registry.counter(
+    'macrobot_inference_rejected_total', 'Image uploads rejected by admission control', ('reason',))
+INFERENCE_RESULTS = registry.counter(
+    'macrobot_inference_results_total', 'Detection results by tier', ('tier',))
+GATE_DECISIONS = registry.counter(
+    'macrobot_gate_decisions_total', 'Inference gate decisions by mode', ('mode', 'decision'))
+GATE_CALIBRATION = registry.counter(
+    'macrobot_gate_calibration_total', 'Gate decisions compared with full inference', ('decision', 'human_detected'))
+
+# Callables run as hook(stage, start, duration) for every timed stage (e.g. profiling spans)
+STAGE_HOOKS = []
+
+@contextmanager
+def stage(name):
+    """Time a block of work as a processing stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, name)
+        for hook in STAGE_HOOKS:
+            hook(name, start, duration)
+
+def observe_stages(timings, prefix=''):
+    """Record a dict of {stage: seconds} measured elsewhere (e.g. by the detector)
+
+    The stages are assumed to have run back to back, ending now.
+    """
+    end = time.perf_counter()
+    for name, seconds in reversed(list(timings.items())):
+        STAGE_SECONDS.observe(seconds, prefix + name)
+        end -= seconds
+        for hook in STAGE_HOOKS:
+            hook(prefix + name, end, seconds)
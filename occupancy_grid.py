@@ -0,0 +1,338 @@
+import os, json, threading
+import numpy as np
+
+# Cell state codes stored in the grid
+CELL_UNKNOWN = 0
+CELL_EXPLORED = 1
+CELL_HUMAN = 2
+CELL_BLOCKED = 3
+
+NO_IMAGE = -1
+
+CELL_DTYPE = np.dtype([
+    ('state', np.int8),
+    ('timestamp', np.float64),
+    ('image_id', np.int32)
+])
+
+class OccupancyGrid:
+    """Dense, growable grid of cell states backed by a memory-mapped .npy file
+
+    Row index is y - origin_y and column index is x - origin_x, so negative
+    world coordinates are handled by moving the origin when the grid grows.
+    Image paths are appended to a side table (one path per line) and
+    referenced from the grid by line number.
+    """
+
+    def __init__(self, path, meta_path, images_path, initial_size=16, max_coordinate=None):
+        self.path = path
+        self.meta_path = meta_path
+        self.images_path = images_path
+        self.initial_size = initial_size
+        self.max_coordinate = max_coordinate  # |x| and |y| limit, so the dense grid stays bounded
+        self.lock = threading.RLock()
+        self.cells = None
+        self.origin_x = 0
+        self.origin_y = 0
+        self.images = []
+        self._load()
+
+    # ===================== PERSISTENCE =====================
+
+    def _load(self):
+        """Open the memory-mapped grid, creating an empty one if needed"""
+        meta = None
+        if os.path.exists(self.meta_path):
+            try:
+                with open(self.meta_path, 'r') as f:
+                    meta = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                meta = None
+
+        if meta is not None and os.path.exists(self.path):
+            self.cells = np.load(self.path, mmap_mode='r+')
+            self.origin_x = meta['origin_x']
+            self.origin_y = meta['origin_y']
+            if os.path.exists(self.images_path):
+                with open(self.images_path, 'r') as f:
+                    self.images = f.read().splitlines()
+        else:
+            half = self.initial_size // 2
+            self._allocate(self.initial_size, self.initial_size, -half, -half)
+
+    def _allocate(self, height, width, origin_x, origin_y, copy_from=None):
+        """Write a new grid file of the given shape and swap it in atomically"""
+        tmp_path = self.path + '.tmp'
+        cells = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=CELL_DTYPE, shape=(height, width))
+        cells['state'] = CELL_UNKNOWN
+        cells['timestamp'] = 0.0
+        cells['image_id'] = NO_IMAGE
+
+        if copy_from is not None:
+            old, old_origin_x, old_origin_y = copy_from
+            row = old_origin_y - origin_y
+            col = old_origin_x - origin_x
+            cells[row:row + old.shape[0], col:col + old.shape[1]] = old
+
+        cells.flush()
+        del cells
+        self.cells = None
+        os.replace(tmp_path, self.path)
+
+        self.cells = np.load(self.path, mmap_mode='r+')
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self._save_meta()
+
+    def _save_meta(self):
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'origin_x': self.origin_x, 'origin_y': self.origin_y}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def flush(self):
+        """Flush cell data to disk"""
+        with self.lock:
+            self.cells.flush()
+
+    def reset(self):
+        """Drop all cells and images"""
+        with self.lock:
+            self.images = []
+            open(self.images_path, 'w').close()
+            half = self.initial_size // 2
+            self._allocate(self.initial_size, self.initial_size, -half, -half)
+
+    # ===================== CELL ACCESS =====================
+
+    def _index(self, x, y):
+        """Convert world coordinates to (row, col), or None if outside the grid"""
+        row = y - self.origin_y
+        col = x - self.origin_x
+        height, width = self.cells.shape
+        if 0 <= row < height and 0 <= col < width:
+            return row, col
+        return None
+
+    def _ensure(self, x, y):
+        """Grow the grid (doubling the exceeded dimension, up to max_coordinate) so (x, y) fits"""
+        if self._index(x, y) is not None:
+            return
+        if not self.in_bounds(x, y):
+            raise ValueError(f"Position ({x}, {y}) is outside the map extent (±{self.max_coordinate})")
+
+        height, width = self.cells.shape
+        min_x, max_x = self.origin_x, self.origin_x + width - 1
+        min_y, max_y = self.origin_y, self.origin_y + height - 1
+
+        if x < min_x:
+            min_x = min(x, min_x - width)
+        elif x > max_x:
+            max_x = max(x, max_x + width)
+        if y < min_y:
+            min_y = min(y, min_y - height)
+        elif y > max_y:
+            max_y = max(y, max_y + height)
+        if self.max_coordinate is not None:
+            # Never grow past the limit, but never shrink a grid created before it was set
+            limit = self.max_coordinate
+            min_x = max(min_x, min(-limit, self.origin_x))
+            max_x = min(max_x, max(limit, self.origin_x + width - 1))
+            min_y = max(min_y, min(-limit, self.origin_y))
+            max_y = min(max_y, max(limit, self.origin_y + height - 1))
+
+        old = np.array(self.cells)
+        self._allocate(max_y - min_y + 1, max_x - min_x + 1, min_x, min_y,
+                       copy_from=(old, self.origin_x, self.origin_y))
+
+    def in_bounds(self, x, y):
+        """Whether a position lies within the configured map extent"""
+        limit = self.max_coordinate
+        return limit is None or (-limit <= x <= limit and -limit <= y <= limit)
+
+    def get_state(self, x, y):
+        """Get the cell state code for a position"""
+        with self.lock:
+            index = self._index(x, y)
+            if index is None:
+                return CELL_UNKNOWN
+            return int(self.cells['state'][index])
+
+    def is_visited(self, x, y):
+        """Check if a position has been visited (explored or blocked)"""
+        return self.get_state(x, y) != CELL_UNKNOWN
+
+    def is_blocked(self, x, y):
+        """Check if a position is blocked"""
+        return self.get_state(x, y) == CELL_BLOCKED
+
+    def mark_explored(self, x, y, human_detected, image_path, timestamp):
+        """Record an explored position with its image and detection result"""
+        with self.lock:
+            self._ensure(x, y)
+            image_id = NO_IMAGE
+            if image_path is not None:
+                image_id = len(self.images)
+                self.images.append(image_path)
+                with open(self.images_path, 'a') as f:
+                    f.write(image_path + '\n')
+
+            index = self._index(x, y)
+            self.cells['state'][index] = CELL_HUMAN if human_detected else CELL_EXPLORED
+            self.cells['timestamp'][index] = timestamp
+            self.cells['image_id'][index] = image_id
+
+    def mark_blocked(self, x, y, timestamp):
+        """Record a permanently blocked position"""
+        with self.lock:
+            self._ensure(x, y)
+            index = self._index(x, y)
+            self.cells['state'][index] = CELL_BLOCKED
+            self.cells['timestamp'][index] = timestamp
+            self.cells['image_id'][index] = NO_IMAGE
+
+    def update_detections(self, detections):
+        """Set the human flag of explored cells from {image_path: human_detected}
+
+        The updated grid is written to a new file and swapped in atomically,
+        so no other process may have the grid open (the server applies
+        updates itself via POST /admin/detections). Returns
+        {image_path: human_detected} for the cells whose state changed.
+        """
+        with self.lock:
+            image_ids = {path: image_id for image_id, path in enumerate(self.images)}
+            new_states = np.full(len(self.images) + 1, CELL_UNKNOWN, dtype=np.int8)  # Last slot: NO_IMAGE
+            for path, human_detected in detections.items():
+                image_id = image_ids.get(path)
+                if image_id is not None:
+                    new_states[image_id] = CELL_HUMAN if human_detected else CELL_EXPLORED
+
+            cells = np.array(self.cells)
+            explored = (cells['state'] == CELL_EXPLORED) | (cells['state'] == CELL_HUMAN)
+            replacement = new_states[cells['image_id']]
+            changed = explored & (replacement != CELL_UNKNOWN) & (replacement != cells['state'])
+            cells['state'][changed] = replacement[changed]
+            if not changed.any():
+                return {}
+
+            height, width = cells.shape
+            self._allocate(height, width, self.origin_x, self.origin_y,
+                           copy_from=(cells, self.origin_x, self.origin_y))
+            return {
+                self.images[image_id]: state == CELL_HUMAN
+                for image_id, state in zip(cells['image_id'][changed].tolist(), cells['state'][changed].tolist())
+            }
+
+    def snapshot(self):
+        """In-memory copy for event-log checkpoints: (cells, origin_x, origin_y, image paths)
+
+        Image ids are renumbered to index a compact list of the images still
+        referenced by a cell, so the copy does not carry the whole image table.
+        """
+        with self.lock:
+            cells = np.array(self.cells)
+            origin_x, origin_y = self.origin_x, self.origin_y
+            images = self.images
+
+        image_ids = cells['image_id']
+        has_image = image_ids != NO_IMAGE
+        used = np.unique(image_ids[has_image])
+        image_ids[has_image] = np.searchsorted(used, image_ids[has_image])
+        return cells, origin_x, origin_y, [images[image_id] for image_id in used.tolist()]
+
+    def import_positions(self, visited_positions, blocked_positions):
+        """Load positions from the legacy JSON map format
+
+        Safe to repeat: images already in the image table (e.g. from an
+        interrupted migration) keep their id instead of being appended again.
+        Positions outside the map extent are dropped.
+        """
+        with self.lock:
+            known_images = {path: image_id for image_id, path in enumerate(self.images)}
+            visited_positions = [pos for pos in visited_positions if self.in_bounds(pos['x'], pos['y'])]
+            blocked_positions = [pos for pos in blocked_positions if self.in_bounds(pos['x'], pos['y'])]
+            for pos in visited_positions:
+                if pos.get('blocked', False):
+                    self.mark_blocked(pos['x'], pos['y'], pos.get('timestamp', 0.0))
+                    continue
+                image_path = pos.get('image_path')
+                known_id = known_images.get(image_path)
+                self.mark_explored(pos['x'], pos['y'], pos.get('human_detected', False),
+                                   image_path if known_id is None else None, pos.get('timestamp', 0.0))
+                if known_id is not None:
+                    self.cells['image_id'][self._index(pos['x'], pos['y'])] = known_id
+            for pos in blocked_positions:
+                self.mark_blocked(pos['x'], pos['y'], pos.get('timestamp', 0.0))
+            self.flush()
+
+    # ===================== VECTORIZED QUERIES =====================
+
+    def _positions(self, mask, include_image=True, include_flags=False):
+        """List the cells selected by a boolean mask, ordered by timestamp"""
+        rows, cols = np.nonzero(mask)
+        timestamps = self.cells['timestamp'][rows, cols]
+        order = np.argsort(timestamps, kind='stable')
+        rows, cols = rows[order], cols[order]
+
+        xs = (cols + self.origin_x).tolist()
+        ys = (rows + self.origin_y).tolist()
+        timestamps = timestamps[order].tolist()
+        image_ids = self.cells['image_id'][rows, cols].tolist()
+        states = self.cells['state'][rows, cols].tolist()
+
+        positions = []
+        for x, y, timestamp, image_id, state in zip(xs, ys, timestamps, image_ids, states):
+            pos = {'x': x, 'y': y}
+            if include_flags:
+                pos['human_detected'] = state == CELL_HUMAN
+                pos['blocked'] = state == CELL_BLOCKED
+            if include_image:
+                pos['image_path'] = self.images[image_id] if image_id != NO_IMAGE else None
+            pos['timestamp'] = timestamp
+            positions.append(pos)
+        return positions
+
+    def visited_positions(self):
+        """All visited cells in the legacy visited_positions format"""
+        with self.lock:
+            return self._positions(self.cells['state'] != CELL_UNKNOWN, include_flags=True)
+
+    def explored_positions(self):
+        with self.lock:
+            return self._positions(self.cells['state'] == CELL_EXPLORED)
+
+    def human_positions(self):
+        with self.lock:
+            return self._positions(self.cells['state'] == CELL_HUMAN)
+
+    def blocked_positions(self):
+        with self.lock:
+            return self._positions(self.cells['state'] == CELL_BLOCKED, include_image=False)
+
+    def frontier(self):
+        """Unknown cells 4-adjacent to an explored (non-blocked) cell"""
+        with self.lock:
+            state = self.cells['state']
+            explored = np.pad((state == CELL_EXPLORED) | (state == CELL_HUMAN), 1)
+            unknown = np.pad(state == CELL_UNKNOWN, 1, constant_values=True)
+
+            neighbour = np.zeros_like(explored)
+            neighbour[1:, :] |= explored[:-1, :]
+            neighbour[:-1, :] |= explored[1:, :]
+            neighbour[:, 1:] |= explored[:, :-1]
+            neighbour[:, :-1] |= explored[:, 1:]
+
+            rows, cols = np.nonzero(unknown & neighbour)
+            xs = (cols - 1 + self.origin_x).tolist()
+            ys = (rows - 1 + self.origin_y).tolist()
+            return [{'x': x, 'y': y} for x, y in zip(xs, ys)]
+
+    def statistics(self):
+        """Cell counts per state"""
+        with self.lock:
+            counts = np.bincount(self.cells['state'].ravel(), minlength=CELL_BLOCKED + 1)
+            return {
+                'total_explored': int(counts[CELL_EXPLORED]),
+                'total_blocked': int(counts[CELL_BLOCKED]),
+                'humans_found': int(counts[CELL_HUMAN])
+            }
@@ -0,0 +1,204 @@
+import os, sys, time, random, itertools, threading
+from collections import deque, Counter
+
+class RequestProfile:
+    """Timing spans and stack samples captured for one request"""
+
+    def __init__(self, profile_id, method, path, sampled):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.sampled = sampled
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.status = None
+        self.finished = False  # Set by Profiler.end(); samples no longer change after that
+        self.spans = []  # (name, offset from request start, duration) in seconds
+        self.samples = Counter()  # collapsed stack -> sample count
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'started_at': self.started_at,
+            'duration': self.duration,
+            'sampled': self.sampled,
+            'sample_count': sum(self.samples.values())
+        }
+
+    def to_dict(self):
+        data = self.summary()
+        data['spans'] = [
+            {'name': name, 'offset': offset, 'duration': duration}
+            for name, offset, duration in self.spans
+        ]
+        return data
+
+    def collapsed_stacks(self):
+        """Stack samples in the collapsed format read by flamegraph.pl and speedscope
+
+        Requests that were not stack-sampled get their timing spans instead,
+        nested by time containment, with each frame's self time in microseconds.
+        """
+        if self.samples:
+            return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+        return ''.join(f'{stack} {micros}\n' for stack, micros in self._span_stacks() if micros > 0)
+
+    def _span_stacks(self):
+        tolerance = 0.001  # Detector stages are back-computed and may overrun their parent slightly
+        root = f'{self.method} {self.path}'
+        spans = sorted(self.spans, key=lambda span: (span[1], -span[2]))
+        open_spans = []  # (stack, end) of the spans enclosing the current one
+        self_times = {root: self.duration or 0.0}
+        for name, offset, duration in spans:
+            # A span is nested when it starts inside the enclosing span and does not (noticeably) outlast it
+            while open_spans and (offset >= open_spans[-1][1] - 1e-6
+                                  or offset + duration > open_spans[-1][1] + tolerance):
+                open_spans.pop()
+            parent = open_spans[-1][0] if open_spans else root
+            stack = f'{parent};{name}'
+            self_times[parent] = self_times.get(parent, 0.0) - duration
+            self_times[stack] = self_times.get(stack, 0.0) + duration
+            open_spans.append((stack, offset + duration))
+        return [(stack, int(seconds * 1e6)) for stack, seconds in self_times.items()]
+
+def _collapse(frame):
+    """Turn a frame into a root-first 'file:function;file:function' string"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class Profiler:
+    """Opt-in per-request profiler
+
+    While enabled, every request records timing spans (cheap). A random
+    `sample_rate` fraction of requests is also stack-sampled every `interval`
+    seconds by a single background thread that only inspects the threads of
+    sampled requests. Requests slower than `slow_threshold` are kept in a ring
+    buffer of `buffer_size` entries.
+    """
+
+    def __init__(self, enabled=False, sample_rate=0.1, interval=0.005, slow_threshold=2.0, buffer_size=50):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.slow_requests = deque(maxlen=buffer_size)
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.local = threading.local()
+        self.sampled_threads = {}  # thread id -> RequestProfile
+        self.wake = threading.Event()
+        self.sampler = None
+
+    def configure(self, enabled=None, sample_rate=None, slow_threshold=None):
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if slow_threshold is not None:
+            self.slow_threshold = float(slow_threshold)
+
+    def settings(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'interval': self.interval,
+            'slow_threshold': self.slow_threshold,
+            'buffer_size': self.slow_requests.maxlen,
+            'captured': len(self.slow_requests)
+        }
+
+    # ===================== REQUEST LIFECYCLE =====================
+
+    def begin(self, method, path):
+        """Start profiling the current request; returns None when disabled"""
+        if not self.enabled:
+            return None
+        sampled = random.random() < self.sample_rate
+        profile = RequestProfile(next(self.ids), method, path, sampled)
+        self.local.profile = profile
+        if sampled:
+            with self.lock:
+                self.sampled_threads[threading.get_ident()] = profile
+                if self.sampler is None:
+                    self.sampler = threading.Thread(target=self._sample_loop, name='profiler-sampler', daemon=True)
+                    self.sampler.start()
+            self.wake.set()
+        return profile
+
+    def end(self, profile, status=None):
+        """Finish a request profile and keep it if it was slow"""
+        if profile is None:
+            return
+        profile.duration = time.perf_counter() - profile.start
+        profile.status = status
+        self.local.profile = None
+        if profile.sampled:
+            # Also stops sampling worker threads still attached (e.g. a detector job that timed out)
+            with self.lock:
+                profile.finished = True
+                for thread_id, sampled_profile in list(self.sampled_threads.items()):
+                    if sampled_profile is profile:
+                        del self.sampled_threads[thread_id]
+        if profile.duration >= self.slow_threshold:
+            with self.lock:
+                self.slow_requests.append(profile)
+
+    def attach(self, profile):
+        """Also stack-sample the current thread for a request's profile (e.g. a worker running its job)"""
+        if profile is None or not profile.sampled:
+            return
+        with self.lock:
+            self.sampled_threads[threading.get_ident()] = profile
+        self.wake.set()
+
+    def detach(self, profile):
+        """Stop sampling the current thread for a profile passed to attach()"""
+        if profile is None or not profile.sampled:
+            return
+        with self.lock:
+            if self.sampled_threads.get(threading.get_ident()) is profile:
+                del self.sampled_threads[threading.get_ident()]
+
+    def record_span(self, name, start, duration):
+        """Attach a timed stage to the current request (no-op outside a profile)"""
+        profile = getattr(self.local, 'profile', None)
+        if profile is not None:
+            profile.spans.append((name, start - profile.start, duration))
+
+    def _sample_loop(self):
+        while True:
+            self.wake.wait()
+            with self.lock:
+                targets = list(self.sampled_threads.items())
+                if not targets:
+                    self.wake.clear()
+                    continue
+            frames = sys._current_frames()
+            stacks = [(profile, _collapse(frames[thread_id])) for thread_id, profile in targets if thread_id in frames]
+            del frames
+            with self.lock:
+                for profile, stack in stacks:
+                    if not profile.finished:
+                        profile.samples[stack] += 1
+            time.sleep(self.interval)
+
+    # ===================== CAPTURED REQUESTS =====================
+
+    def list_slow_requests(self):
+        with self.lock:
+            return [profile.summary() for profile in reversed(self.slow_requests)]
+
+    def get_slow_request(self, profile_id):
+        with self.lock:
+            for profile in self.slow_requests:
+                if profile.id == profile_id:
+                    return profile
+        return None
@@ -0,0 +1,210 @@
+"""
+Offline re-detection over stored uploads
+
+Re-runs the detector on archived images (after changing thresholds or
+models) with a process pool whose workers load the models once, then writes
+the new human_detected flags back into the occupancy grid atomically.
+Progress is checkpointed so an interrupted scan resumes where it stopped;
+the checkpoint is deleted once a scan completes, so the next run rescans.
+
+If the server is running, the results are sent to it (POST /admin/detections)
+because it keeps the grid memory-mapped; otherwise the grid files are
+updated directly. Either way a 'detections' event is logged so event-log
+replay matches the grid.
+
+Usage:
+    python redetect.py                      # every image in uploads/
+    python redetect.py --list-runs          # runs recorded in the event log
+    python redetect.py --run 2 --workers 4  # only images uploaded during run 2
+    python redetect.py --dry-run            # detect and report, do not update the map
+"""
+import os, sys, json, time, argparse
+import urllib.request, urllib.error
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from event_log import EventLog, read_events
+from occupancy_grid import OccupancyGrid
+
+UPLOAD_FOLDER = 'uploads'
+EVENT_LOG_DIR = 'data/events'
+GRID_FILE = 'data/occupancy_grid.npy'
+GRID_META_FILE = 'data/occupancy_grid.json'
+GRID_IMAGES_FILE = 'data/occupancy_grid_images.txt'
+CHECKPOINT_FILE = 'data/redetect_checkpoint.json'
+SERVER = 'http://localhost:8000'
+
+# ===================== WORKERS =====================
+
+_detector = None
+
+def init_worker():
+    """Load the detector models once per worker process"""
+    global _detector
+    from detector.model import HumanDetector
+    _detector = HumanDetector()
+
+def detect_image(image_path, tier):
+    """Returns (image_path, human_detected, error)"""
+    from detector.model import detect_human
+    try:
+        result = detect_human(image_path, detector=_detector, tier=tier)
+        return image_path, bool(result.get('has_human', False)), result.get('error')
+    except Exception as e:
+        return image_path, False, str(e)
+
+# ===================== IMAGE SELECTION =====================
+
+def normalize_path(path):
+    """Paths as stored in the map ('uploads/pos_x_y_id.jpg')"""
+    return os.path.relpath(path).replace(os.sep, '/')
+
+def list_uploads(folder):
+    return sorted(
+        normalize_path(os.path.join(folder, name))
+        for name in os.listdir(folder)
+        if name.lower().endswith(('.jpg', '.jpeg', '.png'))
+    )
+
+def list_runs(event_dir):
+    """Split the event log into runs (a /reset starts a new run) with their images"""
+    runs = []
+    current = None
+    for _, _, event in read_events(event_dir, 1, 0):
+        if current is None or event['type'] == 'reset':
+            current = {'run': len(runs) + 1, 'start': event['ts'], 'end': event['ts'], 'images': []}
+            runs.append(current)
+        current['end'] = event['ts']
+        if event['type'] == 'image' and event.get('image_path'):
+            current['images'].append(event['image_path'])
+    return runs
+
+# ===================== CHECKPOINTS =====================
+
+def load_checkpoint(path):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {'results': {}, 'errors': {}}
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+# ===================== WRITE-BACK =====================
+
+def server_running(server):
+    try:
+        with urllib.request.urlopen(server + '/health', timeout=2):
+            return True
+    except (urllib.error.URLError, OSError):
+        return False
+
+def send_to_server(server, results):
+    """Apply results through the running server; returns the number of changed cells"""
+    body = json.dumps({'detections': results}).encode()
+    req = urllib.request.Request(server + '/admin/detections', data=body, method='POST',
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=60) as response:
+        return json.loads(response.read())['updated']
+
+def write_grid(results, event_dir):
+    """Apply results to the grid files directly (server not running)"""
+    grid = OccupancyGrid(GRID_FILE, GRID_META_FILE, GRID_IMAGES_FILE)
+    changed = grid.update_detections(results)
+    if changed:
+        event_log = EventLog(event_dir)
+        event_log.record('detections', detections=changed)
+        event_log.close()
+    return len(changed)
+
+# ===================== MAIN =====================
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-run human detection over stored uploads')
+    parser.add_argument('--source', default=UPLOAD_FOLDER, help='Folder of images to scan')
+    parser.add_argument('--run', type=int, help='Only images from this run (see --list-runs)')
+    parser.add_argument('--list-runs', action='store_true', help='List runs recorded in the event log and exit')
+    parser.add_argument('--events', default=EVENT_LOG_DIR, help='Event log directory')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--tier', default='full', choices=('full', 'reduced', 'minimal'), help='Detection tier')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE, help='Progress file used to resume')
+    parser.add_argument('--checkpoint-every', type=int, default=25, help='Save progress every N images')
+    parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+    parser.add_argument('--dry-run', action='store_true', help='Do not update the map')
+    parser.add_argument('--server', default=SERVER, help='Server that owns the map, if it is running')
+    args = parser.parse_args()
+
+    if args.list_runs:
+        for run in list_runs(args.events):
+            print(f"run {run['run']}: {time.ctime(run['start'])} - {time.ctime(run['end'])}, "
+                  f"{len(run['images'])} images")
+        return
+
+    selection = f"run {args.run}" if args.run is not None else normalize_path(args.source)
+    if args.run is not None:
+        runs = list_runs(args.events)
+        if not 1 <= args.run <= len(runs):
+            sys.exit(f"Unknown run {args.run} ({len(runs)} runs in {args.events})")
+        images = [path for path in runs[args.run - 1]['images'] if os.path.exists(path)]
+    else:
+        images = list_uploads(args.source)
+
+    checkpoint = {'results': {}, 'errors': {}} if args.restart else load_checkpoint(args.checkpoint)
+    if checkpoint.get('tier', args.tier) != args.tier:
+        sys.exit(f"Checkpoint was made with tier {checkpoint['tier']}; use --restart to rescan")
+    if checkpoint.get('selection', selection) != selection:
+        sys.exit(f"Checkpoint is for {checkpoint['selection']}, an interrupted scan; "
+                 f"resume it or use --restart to rescan")
+    checkpoint['tier'] = args.tier
+    checkpoint['selection'] = selection
+    todo = [path for path in images if path not in checkpoint['results']]
+    print(f"{len(images)} images, {len(images) - len(todo)} already done, {len(todo)} to scan "
+          f"with {args.workers} worker(s)")
+
+    start = time.perf_counter()
+    done = 0
+    if todo:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as pool:
+            futures = [pool.submit(detect_image, os.path.abspath(path), args.tier) for path in todo]
+            try:
+                for future in as_completed(futures):
+                    image_path, human_detected, error = future.result()
+                    path = normalize_path(image_path)
+                    if error:
+                        checkpoint['errors'][path] = error
+                    else:
+                        checkpoint['results'][path] = human_detected
+                        checkpoint['errors'].pop(path, None)
+                    done += 1
+                    if done % args.checkpoint_every == 0:
+                        save_checkpoint(args.checkpoint, checkpoint)
+                        rate = done / (time.perf_counter() - start)
+                        print(f"  {done}/{len(todo)} images ({rate:.2f} images/s)")
+            except KeyboardInterrupt:
+                pool.shutdown(cancel_futures=True)
+                save_checkpoint(args.checkpoint, checkpoint)
+                sys.exit(f"Interrupted after {done} images; progress saved to {args.checkpoint}")
+        save_checkpoint(args.checkpoint, checkpoint)
+
+    elapsed = time.perf_counter() - start
+    results = {path: checkpoint['results'][path] for path in images if path in checkpoint['results']}
+    humans = sum(results.values())
+    print(f"Scanned {done} images in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.2f} images/s); "
+          f"{humans}/{len(results)} with humans, {len(checkpoint['errors'])} errors")
+
+    if not args.dry_run:
+        if server_running(args.server):
+            changed = send_to_server(args.server, results)
+            print(f"Updated {changed} map cells through {args.server}")
+        else:
+            changed = write_grid(results, args.events)
+            print(f"Updated {changed} map cells")
+
+    # The scan is complete: the next run must detect again (e.g. with new thresholds), not reuse these results
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+if __name__ == "__main__":
+    main()